@@ -4,7 +4,18 @@ import sys
 
 class Args:
     playback: str | None = None
+    record: str | None = None
+    # A level to start in, instead of the start menu.
+    level: str | None = None
     speed_test: bool = False
+    headless: bool = False
+    no_draw: bool = False
+    # Whether to run the game logic on another thread while rendering.
+    pipelined: bool = False
+    frames: int | None = None
+    timings: bool = False
+    # Where to write the timings for each frame, as CSV or JSON.
+    timings_path: str | None = None
 
     def __init__(self):
         i = 1
@@ -19,8 +30,40 @@ class Args:
                 self.playback = sys.argv[i]
             elif arg.startswith('--playback='):
                 self.playback = arg[11:]
+            elif arg == '--record':
+                if i == len(sys.argv) - 1:
+                    raise Exception('missing argument for --record')
+                i += 1
+                self.record = sys.argv[i]
+            elif arg.startswith('--record='):
+                self.record = arg[9:]
+            elif arg == '--level':
+                if i == len(sys.argv) - 1:
+                    raise Exception('missing argument for --level')
+                i += 1
+                self.level = sys.argv[i]
+            elif arg.startswith('--level='):
+                self.level = arg[8:]
             elif arg == '--speed-test':
                 self.speed_test = True
+            elif arg == '--headless':
+                self.headless = True
+            elif arg == '--no-draw':
+                self.no_draw = True
+            elif arg == '--pipelined':
+                self.pipelined = True
+            elif arg == '--frames':
+                if i == len(sys.argv) - 1:
+                    raise Exception('missing argument for --frames')
+                i += 1
+                self.frames = int(sys.argv[i])
+            elif arg.startswith('--frames='):
+                self.frames = int(arg[9:])
+            elif arg == '--timings':
+                self.timings = True
+            elif arg.startswith('--timings='):
+                self.timings = True
+                self.timings_path = arg[10:]
             else:
                 raise Exception(f'uknown argument: {arg}')
             i += 1
@@ -29,6 +72,22 @@ class Args:
         args = []
         if self.playback is not None:
             args.append(f'--playback={self.playback}')
+        if self.record is not None:
+            args.append(f'--record={self.record}')
+        if self.level is not None:
+            args.append(f'--level={self.level}')
         if self.speed_test:
             args.append('--speed-test')
+        if self.headless:
+            args.append('--headless')
+        if self.no_draw:
+            args.append('--no-draw')
+        if self.pipelined:
+            args.append('--pipelined')
+        if self.frames is not None:
+            args.append(f'--frames={self.frames}')
+        if self.timings_path is not None:
+            args.append(f'--timings={self.timings_path}')
+        elif self.timings:
+            args.append('--timings')
         return ' '.join(args)
@@ -0,0 +1,178 @@
+
+import glob
+import json
+import os
+import os.path
+import sys
+import time
+import tracemalloc
+import typing
+import pygame
+
+from constants import *
+from frametimer import FrameTimer, CLEAR, DRAW, INPUT, RENDER, UPDATE
+from imagemanager import ImageManager
+from inputmanager import InputRecorder
+from level import Level
+from render.null_renderer import NullRenderer
+from render.rendercontext import RenderContext
+from replay import REPLAY_EXTENSION
+from scene import Scene
+from soundmanager import SoundManager
+
+# Recordings of the inputs to play for a level are stored next to it, with one
+# of these extensions instead of .tmx.
+RECORDING_EXTENSIONS = [REPLAY_EXTENSION, '.inputs']
+
+
+class BenchmarkArgs:
+    frames: int = 600
+    output: str | None = None
+    allocations: bool = False
+    levels: list[str]
+
+    def __init__(self):
+        self.levels = []
+        for arg in sys.argv[1:]:
+            if arg.startswith('--frames='):
+                self.frames = int(arg[9:])
+            elif arg.startswith('--output='):
+                self.output = arg[9:]
+            elif arg == '--allocations':
+                self.allocations = True
+            elif arg.startswith('--'):
+                raise Exception(f'uknown argument: {arg}')
+            else:
+                self.levels.append(arg)
+        if len(self.levels) == 0:
+            # Some levels are named in upper case, like PLATFORM.TMX.
+            self.levels = sorted(
+                path for path in glob.glob('assets/levels/**/*', recursive=True)
+                if path.lower().endswith('.tmx'))
+
+
+def get_recording_path(level_path: str) -> str | None:
+    for extension in RECORDING_EXTENSIONS:
+        path = os.path.splitext(level_path)[0] + extension
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def to_ms(stats: dict[str, int]) -> dict[str, float]:
+    return {name: value / 1000000 for name, value in stats.items()}
+
+
+class Benchmark:
+    args: BenchmarkArgs
+    images: ImageManager
+    sounds: SoundManager
+    renderer: NullRenderer
+    context: RenderContext
+
+    def __init__(self, args: BenchmarkArgs):
+        self.args = args
+        # Run without a display or sound card.
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        pygame.init()
+        window = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.renderer = NullRenderer(window)
+        self.context = RenderContext((RENDER_WIDTH, RENDER_HEIGHT))
+        self.images = ImageManager()
+        self.sounds = SoundManager()
+
+    def run_level(self, path: str) -> dict[str, typing.Any]:
+        """ Loads the level at path and runs it for the configured number of frames. """
+        recording = get_recording_path(path)
+        recorder = InputRecorder()
+        seed = RANDOM_SEED
+        if recording is not None:
+            recorder.load(recording)
+            header = recorder.header
+            if header is not None:
+                if header.level_path != '' and os.path.normpath(header.level_path) != os.path.normpath(path):
+                    raise Exception(
+                        f'{recording} was recorded in {header.level_path!r}, not {path!r}')
+                seed = header.seed
+        if self.args.allocations:
+            tracemalloc.start()
+
+        start = time.perf_counter_ns()
+        scene: Scene | None = Level(None, path, self.images, seed)
+        load_time = time.perf_counter_ns() - start
+
+        if self.args.allocations:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+
+        timer = FrameTimer(self.args.frames)
+        frame = 0
+        while frame < self.args.frames and scene is not None:
+            timer.start_frame()
+            # Without a recording, this just returns no inputs.
+            inputs = recorder.playback(frame)
+            timer.end_phase(INPUT)
+            scene = scene.update(inputs, self.images, self.sounds)
+            timer.end_phase(UPDATE)
+            frame += 1
+            if scene is not None:
+                self.context.clear()
+                self.context.frame = frame
+                timer.end_phase(CLEAR)
+                scene.draw(self.context, self.images)
+                self.context.finish()
+                timer.end_phase(DRAW)
+                self.renderer.render(self.context)
+                timer.end_phase(RENDER)
+            timer.end_frame()
+        recorder.close()
+
+        result: dict[str, typing.Any] = {
+            'path': path,
+            'recording': recording,
+            'frames': frame,
+            'load_ms': load_time / 1000000,
+            'timings_ms': {name: to_ms(stats)
+                           for name, stats in timer.stats().items()},
+        }
+        if self.args.allocations:
+            after, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result['allocations'] = {
+                'retained_bytes': after - before,
+                'peak_bytes': peak - before,
+            }
+        return result
+
+    def run(self) -> dict[str, typing.Any]:
+        results = []
+        for path in self.args.levels:
+            print(f'benchmarking {path}')
+            result = self.run_level(path)
+            timings = result['timings_ms']
+            print(f'  load {result["load_ms"]:.3f}ms, ' +
+                  f'update mean {timings["update"]["mean"]:.3f}ms p99 {timings["update"]["p99"]:.3f}ms, ' +
+                  f'draw mean {timings["draw"]["mean"]:.3f}ms p99 {timings["draw"]["p99"]:.3f}ms')
+            results.append(result)
+        return {
+            'frames': self.args.frames,
+            'allocations': self.args.allocations,
+            'levels': results,
+        }
+
+
+def main():
+    args = BenchmarkArgs()
+    benchmark = Benchmark(args)
+    results = benchmark.run()
+    pygame.quit()
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,14 +6,57 @@ RENDER_WIDTH = 320
 RENDER_HEIGHT = 180
 FRAME_RATE = 60
 
+# How many steps of game logic to run at once when drawing can't keep up,
+# before giving up and letting the game slow down.
+MAX_STEPS_PER_FRAME = 5
+
+# How many times a second to draw at most. Drawing happens in between steps of
+# the game logic, so this keeps it from using a whole core when the display
+# doesn't wait for vsync.
+MAX_DRAW_RATE = 240
+
 # What rendering engine to use.
 USE_OPENGL = True
 
+# Whether the OpenGL renderer should draw tile layers itself, in the shader.
+USE_GPU_TILEMAP = True
+
+# Whether the OpenGL renderer should draw sprites as quads, instead of
+# uploading the surfaces they were drawn onto.
+USE_GPU_SPRITES = True
+
+# Whether to keep compiled copies of maps so they load faster the next time.
+USE_LEVEL_CACHE = True
+LEVEL_CACHE_DIR = '.cache/levels'
+
+# Whether to load images out of assets/textures.png when they're in it.
+USE_TEXTURE_ATLAS = True
+
+# How many of the most recent frames to keep timings for with --timings.
+FRAME_TIMER_CAPACITY = 60 * 60
+
+# How many bytes of decoded images to keep around. 0 means there's no limit.
+IMAGE_CACHE_MAX_BYTES = 0
+
 # How many subpixels to use for game logic.
 SUBPIXELS = 32
 
+# Objects that move more than this in one step are drawn where they ended up,
+# instead of sliding there between steps.
+MAX_INTERPOLATION_DISTANCE = 8 * SUBPIXELS
+
+# The seed for each level's random numbers, so that replays look the same.
+RANDOM_SEED = 0
+
 # Rendering details.
 MAX_LIGHTS = 20
+STATIC_NOISE_SEED = 0  # Set this to None to get different static every run.
+TILE_CHUNK_SIZE = 16  # How many tiles wide and tall a pre-rendered chunk is.
+# How many frames a texture can go undrawn before it's freed.
+TEXTURE_CACHE_GRACE_FRAMES = 60
+
+# How big the cells are in the grid used to find objects near the player.
+SPATIAL_GRID_CELL_SIZE = 32 * SUBPIXELS
 
 # How quickly should the viewport pan to where it wants to be.
 VIEWPORT_PAN_SPEED = 5 * SUBPIXELS
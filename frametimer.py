@@ -0,0 +1,106 @@
+import array
+import json
+import time
+
+# The parts of each frame that are timed separately, in the order they run.
+PHASES = ['input', 'update', 'clear', 'draw', 'render']
+INPUT = 0
+UPDATE = 1
+CLEAR = 2
+DRAW = 3
+RENDER = 4
+
+PERCENTILES = [50, 95, 99]
+
+
+def percentile(values: list[int], p: int) -> int:
+    """ Returns the nearest-rank percentile of values, which must be sorted. """
+    if len(values) == 0:
+        return 0
+    rank = (len(values) * p + 99) // 100
+    return values[max(rank, 1) - 1]
+
+
+class FrameTimer:
+    """ Records how long each phase of the most recent frames took. """
+    capacity: int
+    # The nanoseconds spent in each phase, indexed by frame * len(PHASES) + phase.
+    samples: array.array
+    # How many frames have been recorded in total, including overwritten ones.
+    frames: int
+    last: int
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.samples = array.array('q', bytes(8 * capacity * len(PHASES)))
+        self.frames = 0
+        self.last = 0
+
+    def start_frame(self):
+        offset = self.offset()
+        for phase in range(len(PHASES)):
+            self.samples[offset + phase] = 0
+        self.last = time.perf_counter_ns()
+
+    def end_phase(self, phase: int):
+        """ Adds the time since the frame or the previous phase started to phase. """
+        now = time.perf_counter_ns()
+        self.samples[self.offset() + phase] += now - self.last
+        self.last = now
+
+    def add(self, phase: int, ns: int):
+        """ Adds time that was measured separately to phase. """
+        self.samples[self.offset() + phase] += ns
+
+    def end_frame(self):
+        self.frames += 1
+
+    def offset(self) -> int:
+        return (self.frames % self.capacity) * len(PHASES)
+
+    def rows(self) -> list[list[int]]:
+        """ Returns the recorded frames, oldest first, as [frame, ns for each phase]. """
+        count = min(self.frames, self.capacity)
+        rows = []
+        for frame in range(self.frames - count, self.frames):
+            offset = (frame % self.capacity) * len(PHASES)
+            rows.append([frame] + list(self.samples[offset:offset+len(PHASES)]))
+        return rows
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """ Returns the mean, percentiles, and max for each phase, in nanoseconds. """
+        rows = self.rows()
+        stats = {}
+        for phase, name in enumerate(PHASES + ['total']):
+            if name == 'total':
+                values = sorted(sum(row[1:]) for row in rows)
+            else:
+                values = sorted(row[phase + 1] for row in rows)
+            stats[name] = {'mean': sum(values) // max(len(values), 1)}
+            for p in PERCENTILES:
+                stats[name][f'p{p}'] = percentile(values, p)
+            stats[name]['max'] = values[-1] if len(values) > 0 else 0
+        return stats
+
+    def save(self, path: str):
+        """ Writes the timings to path, as JSON if it ends in .json, or CSV otherwise. """
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump({
+                    'phases': PHASES,
+                    'stats': self.stats(),
+                    'frames': self.rows(),
+                }, f)
+            else:
+                f.write(','.join(['frame'] + PHASES) + '\n')
+                for row in self.rows():
+                    f.write(','.join(str(value) for value in row) + '\n')
+
+    def __str__(self) -> str:
+        lines = [f'frame timings for the last {min(self.frames, self.capacity)} frames, in ms:']
+        columns = ['mean'] + [f'p{p}' for p in PERCENTILES] + ['max']
+        lines.append(f'{"":>8}' + ''.join(f'{c:>9}' for c in columns))
+        for name, values in self.stats().items():
+            lines.append(f'{name:>8}' +
+                         ''.join(f'{values[c] / 1000000:9.3f}' for c in columns))
+        return '\n'.join(lines)
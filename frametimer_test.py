@@ -0,0 +1,39 @@
+import unittest
+
+from frametimer import FrameTimer, PHASES, percentile
+
+
+class TestFrameTimer(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(7, percentile([7], 95))
+        self.assertEqual(0, percentile([], 50))
+
+    def test_ring_buffer_keeps_latest_frames(self):
+        timer = FrameTimer(3)
+        for frame in range(5):
+            timer.start_frame()
+            timer.samples[timer.offset()] = frame
+            timer.end_frame()
+        rows = timer.rows()
+        self.assertEqual([2, 3, 4], [row[0] for row in rows])
+        self.assertEqual([2, 3, 4], [row[1] for row in rows])
+        self.assertEqual(len(PHASES) + 1, len(rows[0]))
+
+    def test_stats(self):
+        timer = FrameTimer(10)
+        for _ in range(4):
+            timer.start_frame()
+            timer.end_phase(0)
+            timer.end_frame()
+        stats = timer.stats()
+        self.assertEqual(set(PHASES + ['total']), set(stats.keys()))
+        self.assertEqual(0, stats['render']['max'])
+        self.assertEqual(stats['input']['max'], stats['total']['max'])
+
+
+if __name__ == '__main__':
+    unittest.main()
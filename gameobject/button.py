@@ -19,7 +19,8 @@ class Button(PlatformBase):
     original_y: int
     clicked: bool = False
     button_type: ButtonType
-    was_occupied: bool
+    was_occupied: bool = False
+    moves = True
     color: str
 
     def __init__(self, obj: MapObject, tilemap: TileMap, images: ImageManager):
@@ -32,6 +33,13 @@ class Button(PlatformBase):
         self.sprite = SpriteSheet(surface, 8, 8)
         self.button_type = obj.properties.button_type
 
+    def save_state(self) -> tuple:
+        return (super().save_state(), self.level, self.clicked, self.was_occupied)
+
+    def restore_state(self, state: tuple):
+        base, self.level, self.clicked, self.was_occupied = state
+        super().restore_state(base)
+
     def get_image_path(self, obj: MapObject):
         color = self.color
         if color == '!white':
@@ -94,6 +94,13 @@ class Door:
                              layer=DoorLayer.DOORS)
         self.sprite.blit(batch, dest, layer=DoorLayer.FRAME)
 
+    def save_state(self) -> tuple:
+        """ Returns the fields that change while the level is played. """
+        return (self.active, self.state, self.frame, self.stars_remaining)
+
+    def restore_state(self, state: tuple):
+        self.active, self.state, self.frame, self.stars_remaining = state
+
     def is_inside(self, player_rect: pygame.Rect) -> bool:
         door_rect = pygame.Rect(self.x + 8*SUBPIXELS,
                                 self.y,
@@ -6,13 +6,13 @@ from constants import *
 from imagemanager import ImageManager
 from properties import ConveyorDirection, Overflow
 from tilemap import MapObject, TileMap
-from random import randint
+from random import Random
 from soundmanager import SoundManager
 from render.rendercontext import RenderContext
 from render.spritebatch import SpriteBatch
 from spritesheet import SpriteSheet
 from switchstate import SwitchState
-from utils import try_move_to_bounds, Direction
+from utils import interpolate, try_move_to_bounds, Direction
 
 
 def sign(n: int) -> int:
@@ -27,20 +27,40 @@ def sign(n: int) -> int:
 
 class Platform(typing.Protocol):
     id: int
+    x: int
+    y: int
     dx: int
     dy: int
     is_solid: bool
     occupied: bool
+    # Whether update can change the platform's bounds.
+    moves: bool
+    # Where the platform was before the last step, to draw it in between.
+    previous_x: int
+    previous_y: int
+
+    @property
+    def bounds(self) -> pygame.Rect:
+        raise Exception('abstract protocol')
 
     def update(self, switches: SwitchState, sounds: SoundManager) -> None:
         raise Exception('abstract protocol')
 
+    def animate(self) -> None:
+        raise Exception('abstract protocol')
+
     def draw(self, context: RenderContext, batch: SpriteBatch, offset: tuple[int, int]) -> None:
         raise Exception('abstract protocol')
 
     def try_move_to(self, player_rect: pygame.Rect, direction: Direction, is_backwards: bool) -> int:
         raise Exception('abstract protocol')
 
+    def save_state(self) -> tuple:
+        raise Exception('abstract protocol')
+
+    def restore_state(self, state: tuple) -> None:
+        raise Exception('abstract protocol')
+
 
 class PlatformBase:
     id: int
@@ -54,6 +74,10 @@ class PlatformBase:
     dy: int
     occupied: bool
     is_solid: bool
+    moves: bool = False
+    # Where the platform was before the last step, to draw it in between.
+    previous_x: int
+    previous_y: int
 
     def __init__(self, obj: MapObject, tilemap: TileMap):
         if obj.gid is None:
@@ -64,6 +88,8 @@ class PlatformBase:
         self.tile_id = obj.gid
         self.x = obj.x * SUBPIXELS
         self.y = obj.y * SUBPIXELS
+        self.previous_x = self.x
+        self.previous_y = self.y
         self.width = obj.width * SUBPIXELS
         self.height = obj.height * SUBPIXELS
         self.dx = 0
@@ -71,9 +97,33 @@ class PlatformBase:
         self.occupied = False
         self.is_solid = obj.properties.solid
 
+    def save_state(self) -> tuple:
+        """ Returns the fields that change while the level is played. """
+        return (self.x, self.y, self.dx, self.dy, self.occupied)
+
+    def restore_state(self, state: tuple):
+        self.x, self.y, self.dx, self.dy, self.occupied = state
+        self.previous_x = self.x
+        self.previous_y = self.y
+
+    @property
+    def bounds(self) -> pygame.Rect:
+        """ The area that the platform can collide with the player in. """
+        return pygame.Rect(self.x, self.y, self.width, self.height)
+
+    def animate(self):
+        """ Advances anything that only changes how the platform looks. """
+        pass
+
+    def get_draw_position(self, context: RenderContext) -> tuple[int, int]:
+        amount = context.interpolation
+        return (interpolate(self.previous_x, self.x, amount),
+                interpolate(self.previous_y, self.y, amount))
+
     def draw(self, context: RenderContext, batch: SpriteBatch, offset: tuple[int, int]):
-        x = self.x + offset[0]
-        y = self.y + offset[1]
+        x, y = self.get_draw_position(context)
+        x += offset[0]
+        y += offset[1]
         dest = pygame.Rect(x, y, self.width, self.height)
         anim = self.tilemap.get_animation(self.tile_id)
         if anim is not None:
@@ -112,6 +162,7 @@ class MovingPlatform(PlatformBase):
     moving_forward: bool
     condition: str | None
     overflow: Overflow
+    moves = True
 
     def __init__(self, obj: MapObject, tilemap: TileMap):
         super().__init__(obj, tilemap)
@@ -150,6 +201,13 @@ class MovingPlatform(PlatformBase):
         self.dx = 0
         self.dy = 0
 
+    def save_state(self) -> tuple:
+        return (super().save_state(), self.moving_forward)
+
+    def restore_state(self, state: tuple):
+        base, self.moving_forward = state
+        super().restore_state(base)
+
     def update(self, switches: SwitchState, sounds: SoundManager):
         if self.condition != None:
             if not switches.is_condition_true(self.condition):
@@ -224,17 +282,35 @@ class Bagel(PlatformBase):
     original_y: int
     falling: bool = False
     remaining: int = BAGEL_WAIT_TIME
+    random: Random
+    # How far to shake the bagel while it's occupied.
+    jiggle: tuple[int, int] = (0, 0)
+    moves = True
 
-    def __init__(self, obj: MapObject, tilemap: TileMap):
+    def __init__(self, obj: MapObject, tilemap: TileMap, random: Random):
         super().__init__(obj, tilemap)
         self.original_y = self.y
+        self.random = random
 
-    def draw(self, context: RenderContext, batch: SpriteBatch, offset: tuple[int, int]):
-        x = self.x + offset[0]
-        y = self.y + offset[1]
+    def save_state(self) -> tuple:
+        return (super().save_state(), self.falling, self.remaining)
+
+    def restore_state(self, state: tuple):
+        base, self.falling, self.remaining = state
+        super().restore_state(base)
+        self.jiggle = (0, 0)
+
+    def animate(self):
         if self.occupied:
-            x += randint(-1, 1)
-            y += randint(-1, 1)
+            self.jiggle = (self.random.randint(-1, 1),
+                           self.random.randint(-1, 1))
+        else:
+            self.jiggle = (0, 0)
+
+    def draw(self, context: RenderContext, batch: SpriteBatch, offset: tuple[int, int]):
+        x, y = self.get_draw_position(context)
+        x += offset[0] + self.jiggle[0]
+        y += offset[1] + self.jiggle[1]
         rect = pygame.Rect(x, y, self.tilemap.tilewidth *
                            SUBPIXELS, self.tilemap.height * SUBPIXELS)
         if rect.bottom < 0 or rect.right < 0:
@@ -285,12 +361,21 @@ class Spring(PlatformBase):
     up: bool = False
     position: int = 0
     stall_counter = SPRING_STALL_FRAMES
+    launch: bool = False
 
     def __init__(self, obj: MapObject, tilemap: TileMap, images: ImageManager):
         super().__init__(obj, tilemap)
         surface = images.load_image('assets/sprites/spring.png')
         self.sprite = SpriteSheet(surface, 8, 8)
 
+    def save_state(self) -> tuple:
+        return (super().save_state(), self.up, self.position,
+                self.stall_counter, self.launch)
+
+    def restore_state(self, state: tuple):
+        base, self.up, self.position, self.stall_counter, self.launch = state
+        super().restore_state(base)
+
     @property
     def frame(self):
         return self.position // SUBPIXELS
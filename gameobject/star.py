@@ -2,7 +2,7 @@
 import pygame
 
 from math import trunc
-from random import randint
+from random import Random
 
 from constants import SUBPIXELS
 from render.rendercontext import RenderContext
@@ -14,8 +14,11 @@ class Star:
     area: pygame.Rect
     tilemap: TileMap
     tile_gid: int
+    random: Random
+    # How far to shake the star, which changes every step.
+    jiggle: tuple[int, int] = (0, 0)
 
-    def __init__(self, obj: MapObject, tilemap: TileMap):
+    def __init__(self, obj: MapObject, tilemap: TileMap, random: Random):
         self.area = pygame.Rect(
             obj.x*SUBPIXELS,
             obj.y*SUBPIXELS,
@@ -25,15 +28,18 @@ class Star:
             raise Exception('star must have gid')
         self.tile_gid = obj.gid
         self.tilemap = tilemap
+        self.random = random
 
     def intersects(self, player_rect: pygame.Rect):
         return intersect(self.area, player_rect)
 
+    def animate(self):
+        self.jiggle = (trunc(self.random.randint(-20, 20) / 20) * SUBPIXELS,
+                       trunc(self.random.randint(-20, 20) / 20) * SUBPIXELS)
+
     def draw(self, context: RenderContext, offset: tuple[int, int]):
-        x = self.area.x + offset[0]
-        y = self.area.y + offset[1]
-        x += trunc(randint(-20, 20) / 20) * SUBPIXELS
-        y += trunc(randint(-20, 20) / 20) * SUBPIXELS
+        x = self.area.x + offset[0] + self.jiggle[0]
+        y = self.area.y + offset[1] + self.jiggle[1]
         rect = pygame.Rect(x, y, self.area.w, self.area.h)
 
         self.tilemap.draw_tile(context.player_batch, self.tile_gid, rect)
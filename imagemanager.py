@@ -1,15 +1,106 @@
-
+import collections
+import os.path
 import pygame
 
-from constants import USE_OPENGL
+from constants import IMAGE_CACHE_MAX_BYTES, USE_OPENGL, USE_TEXTURE_ATLAS
 from font import Font
 
 
 class ImageManager:
     font: Font
+    # Decoded images, keyed by path, with the most recently used last.
+    cache: collections.OrderedDict[str, pygame.Surface]
+    max_bytes: int
+    hits: int
+    misses: int
+    # The size of the cached images, which is kept under max_bytes.
+    bytes: int
+    # The size of the atlas, which is never evicted, so it's left out of bytes.
+    atlas_bytes: int
+    # A single texture with many of the images packed into it.
+    atlas: pygame.Surface | None
+    atlas_index: dict[str, pygame.Rect]
 
-    def __init__(self):
+    def __init__(self, max_bytes: int = IMAGE_CACHE_MAX_BYTES, use_atlas: bool = USE_TEXTURE_ATLAS):
+        self.cache = collections.OrderedDict()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self.atlas_bytes = 0
+        self.atlas = None
+        self.atlas_index = {}
+        if use_atlas:
+            self.load_atlas('assets/textures.png',
+                            'assets/textures_index.txt')
         self.font = Font('assets/8bitfont.tsx', self)
 
+    def load_atlas(self, image_path: str, index_path: str):
+        """ Loads the atlas image, and the index of x,y,w,h,path for each image in it. """
+        print('loading texture atlas from ' + image_path)
+        self.atlas = self.decode_image(image_path)
+        self.atlas_bytes = surface_bytes(self.atlas)
+        self.atlas_index = {}
+        directory = os.path.dirname(index_path)
+        with open(index_path) as f:
+            for line in f:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                parts = line.split(',', 4)
+                if len(parts) != 5:
+                    raise Exception(f'invalid texture index line: {line}')
+                x, y, w, h = [int(part) for part in parts[:4]]
+                path = os.path.normpath(os.path.join(directory, parts[4]))
+                self.atlas_index[path] = pygame.Rect(x, y, w, h)
+
     def load_image(self, path: str) -> pygame.Surface:
-        return pygame.image.load(path)
+        """ Returns the image at path. The surface is shared, so don't modify it. """
+        path = os.path.normpath(path)
+        surface = self.cache.get(path)
+        if surface is not None:
+            self.hits += 1
+            self.cache.move_to_end(path)
+            return surface
+
+        self.misses += 1
+        area = self.atlas_index.get(path)
+        if self.atlas is not None and area is not None:
+            surface = self.atlas.subsurface(area)
+        else:
+            surface = self.decode_image(path)
+
+        self.cache[path] = surface
+        self.bytes += surface_bytes(surface)
+        self.evict()
+        return surface
+
+    def decode_image(self, path: str) -> pygame.Surface:
+        surface = pygame.image.load(path)
+        # Blits are much faster when the pixel format matches the display.
+        if pygame.display.get_surface() is not None:
+            if surface.get_flags() & pygame.SRCALPHA:
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+        return surface
+
+    def evict(self):
+        """ Drops the least recently used images until the cache fits. """
+        if self.max_bytes <= 0:
+            return
+        # Always keep the newest image, even if it's too big by itself.
+        while self.bytes > self.max_bytes and len(self.cache) > 1:
+            _, surface = self.cache.popitem(last=False)
+            self.bytes -= surface_bytes(surface)
+
+    def __str__(self) -> str:
+        return f'images: {len(self.cache)} cached, {self.bytes} bytes, {self.atlas_bytes} atlas bytes, {self.hits} hits, {self.misses} misses'
+
+
+def surface_bytes(surface: pygame.Surface) -> int:
+    # Subsurfaces share their parent's pixels, which are counted once as the
+    # atlas, so they're free.
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_pitch() * surface.get_height()
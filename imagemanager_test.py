@@ -0,0 +1,43 @@
+import pygame
+import unittest
+
+from imagemanager import ImageManager, surface_bytes
+
+
+class TestImageManager(unittest.TestCase):
+    def test_shares_surfaces(self):
+        images = ImageManager()
+        a = images.load_image('assets/sprites/spring.png')
+        b = images.load_image('assets/sprites/../sprites/spring.png')
+        self.assertIs(a, b)
+        self.assertEqual(1, images.hits)
+
+    def test_evicts_least_recently_used(self):
+        images = ImageManager(use_atlas=False)
+        spring = images.load_image('assets/sprites/spring.png')
+        door = images.load_image('assets/sprites/door.png')
+        images.max_bytes = surface_bytes(spring)
+        images.load_image('assets/sprites/spring.png')
+        images.evict()
+        self.assertEqual(['assets/sprites/spring.png'], list(images.cache))
+        self.assertEqual(surface_bytes(spring), images.bytes)
+        self.assertIsNot(door, images.load_image('assets/sprites/door.png'))
+
+    def test_atlas(self):
+        images = ImageManager()
+        spring = images.load_image('assets/sprites/spring.png')
+        self.assertIs(images.atlas, spring.get_parent())
+        self.assertEqual(surface_bytes(images.atlas), images.atlas_bytes)
+        # The atlas is never evicted, so it doesn't count toward the limit.
+        self.assertEqual(0, images.bytes)
+        expected = pygame.image.load('assets/sprites/spring.png')
+        self.assertEqual(pygame.image.tobytes(expected, 'RGBA'),
+                         pygame.image.tobytes(spring, 'RGBA'))
+
+        # Images that aren't in the atlas still get loaded from their files.
+        skelly = images.load_image('assets/sprites/skelly.png')
+        self.assertIsNone(skelly.get_parent())
+
+
+if __name__ == '__main__':
+    unittest.main()
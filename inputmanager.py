@@ -1,9 +1,12 @@
 
+import array
+import bisect
 import pygame
 import typing
 
 from constants import WINDOW_WIDTH, WINDOW_HEIGHT, RENDER_WIDTH, RENDER_HEIGHT
 from enum import Enum
+from replay import REPLAY_EXTENSION, ReplayData, ReplayHeader, is_replay, write_header, write_record
 
 
 class InputState:
@@ -232,37 +235,139 @@ class InputSnapshot:
         self.mouse_x = (encoded >> 32) & 0x0000FFFF
         self.mouse_y = (encoded >> 48) & 0x0000FFFF
 
-
-class RecorderEntry(typing.NamedTuple):
-    frame: int
-    snapshot: int
+    def encode(self) -> int:
+        """ Packs the snapshot back into the int it would be decoded from. """
+        encoded = 0
+        flags = [
+            self.ok,
+            self.ok_down,
+            self.cancel,
+            self.player_left,
+            self.player_right,
+            self.player_crouch,
+            self.player_jump_trigger,
+            self.player_jump_down,
+            self.menu_down,
+            self.menu_up,
+            self.menu_left,
+            self.menu_right,
+            self.mouse_down,
+        ]
+        for bit, flag in enumerate(flags):
+            if flag:
+                encoded |= 1 << bit
+        encoded |= (self.mouse_x & 0x0000FFFF) << 32
+        encoded |= (self.mouse_y & 0x0000FFFF) << 48
+        return encoded
+
+
+# How many bytes of recorded input to buffer before writing them out.
+RECORDER_BUFFER_SIZE = 64 * 1024
 
 
 class InputRecorder:
     previous: int
-    queue: list[RecorderEntry]
+    # The frames where the inputs changed, and what they changed to.
+    frames: typing.Sequence[int]
+    snapshots: typing.Sequence[int]
+    # The index of the next change to play back.
+    cursor: int
+    # The frame that playback expects next, to detect seeking.
+    next_frame: int
+    replay: ReplayData | None
+    # Where and how the loaded replay was recorded, if it was a binary one.
+    header: ReplayHeader | None
+    # The file being recorded to, if any.
+    output: typing.BinaryIO | None
+    binary: bool
+    recorded: int
 
     def __init__(self):
         self.previous = 0
-        self.queue = []
+        self.frames = []
+        self.snapshots = []
+        self.cursor = 0
+        self.next_frame = 0
+        self.replay = None
+        self.header = None
+        self.output = None
+        self.binary = False
+        self.recorded = 0
 
     def playback(self, frame: int) -> InputSnapshot:
-        if len(self.queue) > 0:
-            if self.queue[0].frame == frame:
-                self.previous = self.queue[0].snapshot
-                self.queue = self.queue[1:]
+        if frame != self.next_frame:
+            self.seek(frame)
+        else:
+            while (self.cursor < len(self.frames) and
+                   self.frames[self.cursor] <= frame):
+                self.previous = int(self.snapshots[self.cursor])
+                self.cursor += 1
+        self.next_frame = frame + 1
         return InputSnapshot(self.previous)
 
+    def seek(self, frame: int):
+        """ Moves playback to just after the inputs for the given frame. """
+        self.cursor = bisect.bisect_right(self.frames, frame)
+        self.previous = int(
+            self.snapshots[self.cursor - 1]) if self.cursor > 0 else 0
+        self.next_frame = frame + 1
+
     def load(self, path):
-        f = open(path)
-        text = f.read()
-        lines = [line.strip()
-                 for line in text.split('\n') if len(line.strip()) != 0]
-        for line in lines:
-            frame, snapshot = line.split(',')
-            frame = int(frame)
-            snapshot = int(snapshot)
-            self.queue.append(RecorderEntry(frame, snapshot))
+        """ Loads a binary replay, or a text file of frame,snapshot lines. """
+        if is_replay(path):
+            self.replay = ReplayData(path)
+            self.header = self.replay.header
+            self.frames = self.replay.frames
+            self.snapshots = self.replay.snapshots
+        else:
+            frames = array.array('Q')
+            snapshots = array.array('Q')
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if len(line) == 0:
+                        continue
+                    frame, snapshot = line.split(',')
+                    frames.append(int(frame))
+                    snapshots.append(int(snapshot))
+            self.frames = frames
+            self.snapshots = snapshots
+            self.header = None
+        self.seek(-1)
+
+    def start_recording(self, path: str, header: ReplayHeader = ReplayHeader('', 0)):
+        """ Records to path, in the binary format if it ends in .replay. """
+        self.binary = path.endswith(REPLAY_EXTENSION)
+        self.output = open(path, 'wb', buffering=RECORDER_BUFFER_SIZE)
+        if self.binary:
+            write_header(self.output, header)
+        self.recorded = 0
+
+    def record(self, frame: int, snapshot: InputSnapshot):
+        """ Writes the snapshot for the frame, if it's different from the last one. """
+        if self.output is None:
+            return
+        encoded = snapshot.encode()
+        if encoded == self.recorded:
+            return
+        self.recorded = encoded
+        if self.binary:
+            write_record(self.output, frame, encoded)
+        else:
+            self.output.write(f'{frame},{encoded}\n'.encode('utf-8'))
+
+    def stop_recording(self):
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+    def close(self):
+        self.stop_recording()
+        if self.replay is not None:
+            self.frames = []
+            self.snapshots = []
+            self.replay.close()
+            self.replay = None
 
 
 class InputManager:
@@ -355,13 +460,26 @@ class InputManager:
             self.playback = True
             self.recorder.load(playback_path)
 
+    def replay_header(self) -> ReplayHeader | None:
+        """ Returns where the replay being played back was recorded, if known. """
+        return self.recorder.header
+
+    def start_recording(self, path: str, header: ReplayHeader):
+        self.recorder.start_recording(path, header)
+
     def update(self, frame: int) -> InputSnapshot:
         if self.playback:
-            return self.recorder.playback(frame)
+            snapshot = self.recorder.playback(frame)
+        else:
+            for hook in self.binary_hooks.keys():
+                self.binary_hooks[hook].update(self.state)
+            snapshot = self.take_snapshot()
+        self.recorder.record(frame, snapshot)
+        return snapshot
 
-        for hook in self.binary_hooks.keys():
-            self.binary_hooks[hook].update(self.state)
-        return self.take_snapshot()
+    def close(self):
+        """ Finishes writing any recording. """
+        self.recorder.close()
 
     def take_snapshot(self) -> InputSnapshot:
         snapshot = InputSnapshot()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from inputmanager import InputRecorder, InputSnapshot
+from replay import ReplayData, ReplayHeader
+
+
+class TestInputRecorder(unittest.TestCase):
+
+    def test_encode_round_trip(self):
+        snapshot = InputSnapshot()
+        snapshot.ok_down = True
+        snapshot.player_right = True
+        snapshot.mouse_down = True
+        snapshot.mouse_x = 319
+        snapshot.mouse_y = 179
+        decoded = InputSnapshot(snapshot.encode())
+        self.assertEqual(vars(snapshot), vars(decoded))
+        self.assertEqual(snapshot.encode(), decoded.encode())
+        self.assertEqual(0, InputSnapshot().encode())
+
+    def test_record_only_writes_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'inputs.txt')
+            recorder = InputRecorder()
+            recorder.start_recording(path)
+            encoded = [0, 0, 1 << 4, 1 << 4, 1 << 4, 0, (5 << 32) | 1]
+            for frame, value in enumerate(encoded):
+                recorder.record(frame, InputSnapshot(value))
+            recorder.stop_recording()
+
+            with open(path) as f:
+                lines = f.read().split()
+            self.assertEqual(['2,16', '5,0', f'6,{(5 << 32) | 1}'], lines)
+
+            player = InputRecorder()
+            player.load(path)
+            for frame, value in enumerate(encoded):
+                self.assertEqual(value, player.playback(frame).encode())
+
+
+    def test_binary_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'inputs.replay')
+            recorder = InputRecorder()
+            recorder.start_recording(path, ReplayHeader('levels/a.tmx', 42))
+            encoded = [0, 3, 3, 3, 8, 8, 0, 0, 1 << 50]
+            for frame, value in enumerate(encoded):
+                recorder.record(frame, InputSnapshot(value))
+            recorder.stop_recording()
+
+            replay = ReplayData(path)
+            self.assertEqual(ReplayHeader('levels/a.tmx', 42), replay.header)
+            self.assertEqual([1, 4, 6, 8], list(replay.frames))
+            replay.close()
+
+            player = InputRecorder()
+            player.load(path)
+            self.assertEqual(ReplayHeader('levels/a.tmx', 42), player.header)
+            for frame, value in enumerate(encoded):
+                self.assertEqual(value, player.playback(frame).encode())
+            # Seeking backwards and forwards lands on the right inputs.
+            for frame in [5, 0, 7, 3, 100, 2]:
+                expected = encoded[min(frame, len(encoded) - 1)]
+                self.assertEqual(expected, player.playback(frame).encode())
+            self.assertEqual(3, player.playback(3).encode())
+            self.assertEqual(8, player.playback(4).encode())
+            player.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
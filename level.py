@@ -1,6 +1,7 @@
 
 import os.path
 import pygame
+import random
 import typing
 
 # Import the whole module to avoid a circular reference.
@@ -16,11 +17,31 @@ from player import Player2, PlayerState
 from gameobject.platforms import Bagel, Conveyor, MovingPlatform, Platform, Spring
 from render.rendercontext import RenderContext
 from scene import Scene
+from spatialgrid import SpatialGrid
 from soundmanager import Sound, SoundManager
 from gameobject.star import Star
 from switchstate import SwitchState
 from tilemap import TileMap, load_map
-from utils import Direction, cmp_in_direction, intersect
+from utils import Direction, cmp_in_direction, interpolate, intersect
+
+
+class LevelSnapshot(typing.NamedTuple):
+    """ Everything in a level that changes while it's played. """
+    player: tuple
+    platforms: list[tuple]
+    doors: list[tuple]
+    stars: list[Star]
+    star_count: int
+    switches: set[str]
+    counters: tuple[int, bool, int, int, int, int]
+    toast: tuple[str, int, int]
+    map_offset: tuple[int, int]
+    current_platform: Platform | None
+    current_slopes: set[int]
+    current_switch_tiles: set[int]
+    current_door: Door | None
+    animations: list[tuple[int, int]]
+    random: tuple
 
 
 class Level:
@@ -29,6 +50,9 @@ class Level:
     map: TileMap
     map_path: str
     player: Player2
+    # All of the randomness in the level comes from here, so it can be replayed.
+    seed: int
+    random: random.Random
 
     wall_stick_counter: int = WALL_STICK_TIME
     wall_stick_facing_right: bool = False
@@ -38,7 +62,9 @@ class Level:
     jump_grace_counter: int = 0
     spring_counter: int = 0
 
-    previous_map_offset: None | tuple[int, int]
+    # Where the view of the map is, and where it was before the last step.
+    map_offset: tuple[int, int]
+    previous_map_offset: tuple[int, int]
     toast_text: str
     toast_position: int = -TOAST_HEIGHT
     toast_counter: int = TOAST_TIME
@@ -55,15 +81,26 @@ class Level:
     current_switch_tiles: set[int]
     current_door: Door | None
 
-    def __init__(self, parent: Scene | None, map_path: str, images: ImageManager):
+    # Grids to find the objects near the player without checking all of them.
+    platform_grid: SpatialGrid[Platform]
+    moving_platforms: list[Platform]
+    star_grid: SpatialGrid[Star]
+    warp_grid: SpatialGrid[Warp]
+
+    # How the level was when it was loaded, so it can be restarted.
+    initial_state: LevelSnapshot
+
+    def __init__(self, parent: Scene | None, map_path: str, images: ImageManager, seed: int = RANDOM_SEED):
         self.previous = parent
-        self.next_func = lambda destination: Level(parent, destination, images)
+        self.next_func = lambda destination: Level(
+            parent, destination, images, seed)
         self.name = os.path.splitext(os.path.basename(map_path))[0]
         self.toast_text = self.name
-        self.previous_map_offset = None
         self.map = load_map(map_path, images)
         self.map_path = map_path
-        self.player = Player2(images)
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.player = Player2(images, self.random)
         self.player.x = (128 * SUBPIXELS) // 16
         self.player.y = (128 * SUBPIXELS) // 16
         self.transition: str = ''
@@ -80,7 +117,7 @@ class Level:
             if obj.properties.platform:
                 self.platforms.append(MovingPlatform(obj, self.map))
             if obj.properties.bagel:
-                self.platforms.append(Bagel(obj, self.map))
+                self.platforms.append(Bagel(obj, self.map, self.random))
             if obj.properties.convey is not None:
                 self.platforms.append(Conveyor(obj, self.map))
             if obj.properties.spring:
@@ -92,7 +129,7 @@ class Level:
             if obj.properties.warp:
                 self.warps.append(Warp(obj))
             if obj.properties.star:
-                self.stars.append(Star(obj, self.map))
+                self.stars.append(Star(obj, self.map, self.random))
             if obj.properties.spawn:
                 self.player.x = obj.x * SUBPIXELS
                 self.player.y = obj.y * SUBPIXELS
@@ -102,9 +139,89 @@ class Level:
                 if obj.properties.facing_left:
                     self.player.facing_right = False
 
+        self.platform_grid = SpatialGrid(SPATIAL_GRID_CELL_SIZE)
+        for platform in self.platforms:
+            self.platform_grid.insert(platform, platform.bounds)
+        self.moving_platforms = [p for p in self.platforms if p.moves]
+        self.build_star_grid()
+        self.warp_grid = SpatialGrid(SPATIAL_GRID_CELL_SIZE)
+        for warp in self.warps:
+            self.warp_grid.insert(warp, warp.position)
+
+        self.player.previous_x = self.player.x
+        self.player.previous_y = self.player.y
+        self.map_offset = self.get_target_map_offset()
+        self.previous_map_offset = self.map_offset
+
+        self.initial_state = self.snapshot()
+
     def parent(self) -> Scene | None:
         return self.previous
 
+    def build_star_grid(self):
+        self.star_grid = SpatialGrid(SPATIAL_GRID_CELL_SIZE)
+        for star in self.stars:
+            self.star_grid.insert(star, star.area)
+
+    def update_platform_grid(self):
+        for platform in self.moving_platforms:
+            self.platform_grid.update(platform, platform.bounds)
+
+    #
+    # Snapshots.
+    #
+
+    def snapshot(self) -> LevelSnapshot:
+        """ Copies the parts of the level that change, but not the map. """
+        return LevelSnapshot(
+            self.player.save_state(),
+            [platform.save_state() for platform in self.platforms],
+            [door.save_state() for door in self.doors],
+            list(self.stars),
+            self.star_count,
+            set(self.switches.on),
+            (self.wall_stick_counter, self.wall_stick_facing_right,
+             self.wall_slide_counter, self.coyote_counter,
+             self.jump_grace_counter, self.spring_counter),
+            (self.toast_text, self.toast_position, self.toast_counter),
+            self.map_offset,
+            self.current_platform,
+            set(self.current_slopes),
+            set(self.current_switch_tiles),
+            self.current_door,
+            self.map.save_animations(),
+            self.random.getstate())
+
+    def restore(self, snapshot: LevelSnapshot):
+        """ Puts the level back the way it was when snapshot was taken. """
+        self.player.restore_state(snapshot.player)
+        for platform, state in zip(self.platforms, snapshot.platforms):
+            platform.restore_state(state)
+        for door, state in zip(self.doors, snapshot.doors):
+            door.restore_state(state)
+        self.stars = list(snapshot.stars)
+        self.build_star_grid()
+        self.star_count = snapshot.star_count
+        self.switches.restore(snapshot.switches)
+        (self.wall_stick_counter, self.wall_stick_facing_right,
+         self.wall_slide_counter, self.coyote_counter,
+         self.jump_grace_counter, self.spring_counter) = snapshot.counters
+        self.toast_text, self.toast_position, self.toast_counter = snapshot.toast
+        self.map_offset = snapshot.map_offset
+        self.previous_map_offset = self.map_offset
+        self.current_platform = snapshot.current_platform
+        self.current_slopes = set(snapshot.current_slopes)
+        self.current_switch_tiles = set(snapshot.current_switch_tiles)
+        self.current_door = snapshot.current_door
+        self.map.restore_animations(snapshot.animations)
+        self.random.setstate(snapshot.random)
+        self.update_platform_grid()
+
+    def restart(self) -> 'Level':
+        """ Returns the level to the way it was when it was loaded. """
+        self.restore(self.initial_state)
+        return self
+
     #
     # Movement.
     #
@@ -190,7 +307,7 @@ class Level:
                                     is_backwards: bool = False
                                     ) -> PlatformIntersectionResult:
         result = Level.PlatformIntersectionResult()
-        for platform in self.platforms:
+        for platform in self.platform_grid.query(player_rect):
             distance = platform.try_move_to(
                 player_rect, direction, is_backwards)
             if distance == 0:
@@ -568,8 +685,15 @@ class Level:
 
         self.map.update_animations()
 
+        self.player.previous_x = self.player.x
+        self.player.previous_y = self.player.y
+        for platform in self.moving_platforms:
+            platform.previous_x = platform.x
+            platform.previous_y = platform.y
+
         for platform in self.platforms:
             platform.update(self.switches, sounds)
+        self.update_platform_grid()
 
         movement = Level.PlayerMovementResult()
         if self.player.state != PlayerState.STOPPED:
@@ -588,19 +712,20 @@ class Level:
             door.update(player_rect, self.star_count)
             if door.is_closed:
                 if door.destination is not None:
-                    return Level(self.previous, door.destination, images)
-                return Level(self.previous, self.map_path, images)
+                    return Level(self.previous, door.destination, images, self.seed)
+                return Level(self.previous, self.map_path, images, self.seed)
             if door.active:
                 self.current_door = door
 
-        for warp in self.warps:
+        for warp in self.warp_grid.query(player_rect):
             if warp.is_inside(player_rect):
                 return self.next_func(warp.destination)
 
-        for star in self.stars:
+        for star in self.star_grid.query(player_rect):
             if star.intersects(player_rect):
                 sounds.play(Sound.STAR)
                 self.stars.remove(star)
+                self.star_grid.remove(star)
                 self.star_count += 1
                 self.toast_text = f'STARS x {self.star_count}'
                 self.toast_counter = TOAST_TIME
@@ -633,6 +758,8 @@ class Level:
                 self.transition = transition
                 print(transition)
 
+        self.animate()
+
         if self.player.is_dead:
             return menu.Menu('assets/menus/dead.tmx', self, self.map_path, images)
 
@@ -646,27 +773,42 @@ class Level:
 
         return self
 
-    def draw(self, context: RenderContext, images: ImageManager) -> None:
-        dest = context.logical_area
+    #
+    # Animation and the view.
+    #
+
+    def animate(self):
+        """ Advances everything that only changes how the level looks by one step. """
+        for platform in self.platforms:
+            platform.animate()
+        for star in self.stars:
+            star.animate()
+        self.player.animate()
+        self.update_map_offset()
+
+    def get_target_map_offset(self) -> tuple[int, int]:
+        """ Returns where the view should be to center the player, if possible. """
+        width = RENDER_WIDTH * SUBPIXELS
+        height = RENDER_HEIGHT * SUBPIXELS
 
         # Make sure the player is on the screen, and then center them if possible.
         player_rect = self.player.get_target_bounds_rect(None)
         preferred_x, preferred_y = self.map.get_preferred_view(player_rect)
         player_x = self.player.x
         player_y = self.player.y
-        player_draw_x: int = dest.width // 2
-        player_draw_y: int = dest.height // 2
+        player_draw_x: int = width // 2
+        player_draw_y: int = height // 2
         # Don't waste space on the sides of the screen beyond the map.
         if player_draw_x > player_x:
             player_draw_x = player_x
         # The map is drawn 4 pixels from the top of the screen.
         if player_draw_y > player_y + 4:
             player_draw_y = player_y + 4
-        right_limit = dest.width - \
+        right_limit = width - \
             (self.map.width * self.map.tilewidth * SUBPIXELS)
         if player_draw_x < player_x + right_limit:
             player_draw_x = player_x + right_limit
-        bottom_limit = dest.height - \
+        bottom_limit = height - \
             (self.map.height * self.map.tileheight * SUBPIXELS)
         if player_draw_y < player_y + bottom_limit:
             player_draw_y = player_y + bottom_limit
@@ -676,27 +818,44 @@ class Level:
 
         if preferred_x is not None:
             map_offset = (-preferred_x, map_offset[1])
-            player_draw_x = player_x + map_offset[0]
         if preferred_y is not None:
             map_offset = (map_offset[0], -preferred_y)
-            player_draw_y = player_y + map_offset[1]
-
-        # Don't let the viewport move too much in between frames.
-        if self.previous_map_offset is not None:
-            prev = self.previous_map_offset
-            if abs(map_offset[0] - prev[0]) > VIEWPORT_PAN_SPEED:
-                if prev[0] < map_offset[0]:
-                    map_offset = (prev[0] + VIEWPORT_PAN_SPEED, map_offset[1])
-                elif prev[0] > map_offset[0]:
-                    map_offset = (prev[0] - VIEWPORT_PAN_SPEED, map_offset[1])
-                player_draw_x = player_x + map_offset[0]
-            if abs(map_offset[1] - prev[1]) > VIEWPORT_PAN_SPEED:
-                if prev[1] < map_offset[1]:
-                    map_offset = (map_offset[0], prev[1] + VIEWPORT_PAN_SPEED)
-                elif prev[1] > map_offset[1]:
-                    map_offset = (map_offset[0], prev[1] - VIEWPORT_PAN_SPEED)
-                player_draw_y = player_y + map_offset[1]
-        self.previous_map_offset = map_offset
+        return map_offset
+
+    def update_map_offset(self):
+        """ Moves the view toward the player, but not too far in one step. """
+        map_offset = self.get_target_map_offset()
+        prev = self.map_offset
+        if abs(map_offset[0] - prev[0]) > VIEWPORT_PAN_SPEED:
+            if prev[0] < map_offset[0]:
+                map_offset = (prev[0] + VIEWPORT_PAN_SPEED, map_offset[1])
+            elif prev[0] > map_offset[0]:
+                map_offset = (prev[0] - VIEWPORT_PAN_SPEED, map_offset[1])
+        if abs(map_offset[1] - prev[1]) > VIEWPORT_PAN_SPEED:
+            if prev[1] < map_offset[1]:
+                map_offset = (map_offset[0], prev[1] + VIEWPORT_PAN_SPEED)
+            elif prev[1] > map_offset[1]:
+                map_offset = (map_offset[0], prev[1] - VIEWPORT_PAN_SPEED)
+        self.previous_map_offset = self.map_offset
+        self.map_offset = map_offset
+
+    #
+    # Drawing.
+    #
+
+    def draw(self, context: RenderContext, images: ImageManager) -> None:
+        dest = context.logical_area
+
+        # Draw the player and the view part of the way through the last step.
+        amount = context.interpolation
+        player_x = interpolate(self.player.previous_x, self.player.x, amount)
+        player_y = interpolate(self.player.previous_y, self.player.y, amount)
+        map_offset = (
+            interpolate(self.previous_map_offset[0],
+                        self.map_offset[0], amount),
+            interpolate(self.previous_map_offset[1], self.map_offset[1], amount))
+        player_draw_x = player_x + map_offset[0]
+        player_draw_y = player_y + map_offset[1]
 
         # Do the actual drawing.
         self.map.draw_background(context, context.player_batch,
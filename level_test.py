@@ -0,0 +1,95 @@
+import contextlib
+import io
+import os
+import pygame
+import unittest
+
+import tilemap
+
+from constants import RENDER_WIDTH, RENDER_HEIGHT, USE_LEVEL_CACHE
+from imagemanager import ImageManager
+from inputmanager import InputSnapshot
+from level import Level
+from render.rendercontext import RenderContext
+from soundmanager import SoundManager
+
+
+def setUpModule():
+    # Don't write cached maps into the working directory.
+    tilemap.USE_LEVEL_CACHE = False
+
+
+def tearDownModule():
+    tilemap.USE_LEVEL_CACHE = USE_LEVEL_CACHE
+
+
+def run(level: Level, frames: int, images: ImageManager, sounds: SoundManager,
+        context: RenderContext | None = None) -> list[tuple]:
+    """ Plays the level with scripted inputs, and returns its state each frame.
+
+    If context is set, the level is drawn a few times in between each frame.
+    """
+    states = []
+    for frame in range(frames):
+        inputs = InputSnapshot()
+        inputs.player_right = frame % 40 < 30
+        inputs.player_jump_trigger = frame % 40 == 30
+        inputs.player_jump_down = frame % 40 >= 30
+        with contextlib.redirect_stdout(io.StringIO()):
+            scene = level.update(inputs, images, sounds)
+        if scene is not level:
+            break
+        if context is not None:
+            for interpolation in [0.0, 0.5, 1.0]:
+                context.clear()
+                context.interpolation = interpolation
+                level.draw(context, images)
+        states.append((level.player.save_state(),
+                       [platform.save_state() for platform in level.platforms],
+                       level.star_count,
+                       level.random.random()))
+    return states
+
+
+class TestLevelSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        pygame.mixer.init()
+        self.images = ImageManager(use_atlas=False)
+        self.sounds = SoundManager()
+
+    def tearDown(self):
+        pygame.mixer.quit()
+
+    def load(self, path: str) -> Level:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return Level(None, path, self.images)
+
+    def test_restore_replays_the_same(self):
+        level = self.load('assets/levels/MAIN/W1/09.tmx')
+        run(level, 30, self.images, self.sounds)
+        snapshot = level.snapshot()
+        expected = run(level, 90, self.images, self.sounds)
+        self.assertGreater(len(expected), 0)
+        level.restore(snapshot)
+        self.assertEqual(expected, run(level, 90, self.images, self.sounds))
+
+    def test_restart_matches_reloading(self):
+        path = 'assets/levels/MAIN/champ road/final breath.tmx'
+        level = self.load(path)
+        run(level, 120, self.images, self.sounds)
+        level.restart()
+        expected = run(self.load(path), 120, self.images, self.sounds)
+        self.assertEqual(expected, run(level, 120, self.images, self.sounds))
+
+    def test_drawing_does_not_change_the_level(self):
+        path = 'assets/levels/MAIN/W1/09.tmx'
+        expected = run(self.load(path), 120, self.images, self.sounds)
+        context = RenderContext((RENDER_WIDTH, RENDER_HEIGHT))
+        self.assertEqual(expected, run(self.load(path), 120,
+                         self.images, self.sounds, context))
+
+
+if __name__ == '__main__':
+    unittest.main()
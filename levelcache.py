@@ -0,0 +1,101 @@
+import hashlib
+import os
+import os.path
+import pickle
+import typing
+
+from constants import LEVEL_CACHE_DIR
+
+# The cached objects are pickled, so any change to the code that defines them
+# has to invalidate the cache. Rather than trying to remember to bump a version
+# number, the cache is keyed on the contents of these files.
+CODE_FILES = [
+    'constants.py',
+    'levelcache.py',
+    'properties.py',
+    'slope.py',
+    'spatialgrid.py',
+    'spritesheet.py',
+    'switchstate.py',
+    'tilemap.py',
+    'tileset.py',
+    'utils.py',
+]
+
+
+class SourceStamp(typing.NamedTuple):
+    path: str
+    mtime: int
+    size: int
+
+
+class CacheHeader(typing.NamedTuple):
+    code_hash: str
+    path: str
+    sources: list[SourceStamp]
+
+
+def get_code_hash() -> str:
+    md5 = hashlib.md5()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        with open(os.path.join(directory, name), 'rb') as f:
+            md5.update(f.read())
+    return md5.hexdigest()
+
+
+code_hash = get_code_hash()
+
+
+def get_cache_path(path: str, cache_dir: str) -> str:
+    key = hashlib.md5(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key + '.bin')
+
+
+def stamp(path: str) -> SourceStamp:
+    info = os.stat(path)
+    return SourceStamp(path, info.st_mtime_ns, info.st_size)
+
+
+def load(path: str, cache_dir: str = LEVEL_CACHE_DIR) -> typing.Any | None:
+    """ Returns the cached value for path, or None if it's missing or stale. """
+    cache_path = get_cache_path(path, cache_dir)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            data = f.read()
+        view = memoryview(data)
+        header_size = int.from_bytes(view[:4], 'little')
+        header = pickle.loads(view[4:4+header_size])
+        if not isinstance(header, CacheHeader):
+            return None
+        if header.code_hash != code_hash or header.path != path:
+            return None
+        for source in header.sources:
+            if stamp(source.path) != source:
+                return None
+        return pickle.loads(view[4+header_size:])
+    except Exception as e:
+        print(f'unable to read cache for {path}: {e}')
+        return None
+
+
+def save(path: str, sources: list[str], value: typing.Any, cache_dir: str = LEVEL_CACHE_DIR):
+    """ Stores value as the compiled version of path, which was loaded from sources. """
+    cache_path = get_cache_path(path, cache_dir)
+    try:
+        header = CacheHeader(code_hash, path, [stamp(source)
+                             for source in sources])
+        header_data = pickle.dumps(header, pickle.HIGHEST_PROTOCOL)
+        value_data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so a partial file is never read.
+        temp_path = cache_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(len(header_data).to_bytes(4, 'little'))
+            f.write(header_data)
+            f.write(value_data)
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        print(f'unable to write cache for {path}: {e}')
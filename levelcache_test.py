@@ -0,0 +1,40 @@
+import os
+import os.path
+import tempfile
+import unittest
+
+import levelcache
+
+
+class TestLevelCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        self.source = os.path.join(self.temp_dir.name, 'level.tmx')
+        with open(self.source, 'w') as f:
+            f.write('<map/>')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        self.assertIsNone(levelcache.load(self.source, self.cache_dir))
+        levelcache.save(self.source, [self.source], {'a': [1, 2]},
+                        self.cache_dir)
+        self.assertEqual({'a': [1, 2]},
+                         levelcache.load(self.source, self.cache_dir))
+
+    def test_stale_source(self):
+        levelcache.save(self.source, [self.source], 'value', self.cache_dir)
+        with open(self.source, 'w') as f:
+            f.write('<map></map>')
+        self.assertIsNone(levelcache.load(self.source, self.cache_dir))
+
+    def test_missing_source(self):
+        levelcache.save(self.source, [self.source], 'value', self.cache_dir)
+        os.remove(self.source)
+        self.assertIsNone(levelcache.load(self.source, self.cache_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,22 @@
 
+import concurrent.futures
 import datetime
+import os
 import pygame
+import time
 
 from args import Args
 from constants import *
+from frametimer import FrameTimer, INPUT, UPDATE, CLEAR, DRAW, RENDER
 from imagemanager import ImageManager
 from inputmanager import InputManager
 from level import Level
 from levelselect import LevelSelect
 from menu import Menu
-from render.rendercontext import RenderContext
+from render.null_renderer import NullRenderer
+from render.rendercontext import PixelCache, RenderContext
 from render.renderer import Renderer
+from replay import ReplayHeader
 from scene import Scene
 from soundmanager import SoundManager
 
@@ -25,6 +31,9 @@ class Game:
     static: pygame.Surface
     renderer: Renderer
     render_context: RenderContext
+    # Shared by every render context, so each surface is only copied once.
+    pixel_cache: PixelCache
+    use_opengl: bool
 
     images: ImageManager
     inputs: InputManager
@@ -32,8 +41,15 @@ class Game:
 
     scene: Scene | None
     frame: int
+    # Whether to skip drawing entirely, and only run the game logic.
+    no_draw: bool
+    timer: FrameTimer | None
 
     def __init__(self, args: Args):
+        if args.headless:
+            # Use SDL's dummy drivers, so no display or sound card is needed.
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
         pygame.init()
         pygame.display.set_caption('purpy')
         pygame.mouse.set_visible(False)
@@ -42,9 +58,13 @@ class Game:
         window = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
         print('initializing render context')
         render_area = pygame.Rect(0, 0, RENDER_WIDTH, RENDER_HEIGHT)
-        self.render_context = RenderContext(render_area.size)
+        self.use_opengl = USE_OPENGL and not args.headless
+        self.pixel_cache = PixelCache()
+        self.render_context = self.create_render_context()
         print('initializing renderer')
-        if USE_OPENGL:
+        if args.headless:
+            self.renderer = NullRenderer(window)
+        elif self.use_opengl:
             self.renderer = OpenGLRenderer(render_area, destination, window)
         else:
             self.renderer = PygameRenderer(render_area, destination, window)
@@ -54,9 +74,41 @@ class Game:
         self.inputs = InputManager(args.playback)
         self.sounds = SoundManager()
         self.frame = 0
+        self.no_draw = args.no_draw
+        self.timer = FrameTimer(FRAME_TIMER_CAPACITY) if args.timings else None
 
-        # self.scene = LevelSelect(None, 'assets/levels', self.images)
-        self.scene = Menu('assets/menus/start.tmx', None, None, self.images)
+        header = self.get_start(args)
+        if header.level_path == '':
+            # self.scene = LevelSelect(None, 'assets/levels', self.images)
+            self.scene = Menu('assets/menus/start.tmx',
+                              None, None, self.images)
+        else:
+            self.scene = Level(None, header.level_path,
+                               self.images, header.seed)
+        if args.record is not None:
+            self.inputs.start_recording(args.record, header)
+
+    def get_start(self, args: Args) -> ReplayHeader:
+        """ Returns the level to start in, or '' for the menu, and the seed for it. """
+        header = ReplayHeader(args.level or '', RANDOM_SEED)
+        recorded = self.inputs.replay_header()
+        if recorded is None:
+            return header
+        if args.level is not None and os.path.normpath(args.level) != os.path.normpath(recorded.level_path):
+            raise Exception(
+                f'replay was recorded in {recorded.level_path!r}, not {args.level!r}')
+        if recorded.level_path == '' and recorded.seed != RANDOM_SEED:
+            # Levels started from the menu always use the default seed.
+            raise Exception(
+                f'replay was recorded with seed {recorded.seed}, but levels use {RANDOM_SEED}')
+        return recorded
+
+    def create_render_context(self) -> RenderContext:
+        context = RenderContext((RENDER_WIDTH, RENDER_HEIGHT),
+                                self.use_opengl and USE_GPU_SPRITES,
+                                self.pixel_cache)
+        context.draw_tile_grids = self.use_opengl and USE_GPU_TILEMAP
+        return context
 
     def compute_scaled_buffer_dest(self) -> pygame.Rect:
         target_aspect_ratio = RENDER_WIDTH / RENDER_HEIGHT
@@ -70,29 +122,77 @@ class Game:
             return pygame.Rect(0, (WINDOW_HEIGHT - needed_height)//2, WINDOW_WIDTH, needed_height)
 
     def update(self) -> bool:
-        """ Returns True if the game should keep running. """
+        """ Runs one step of the game logic. Returns True if the game should keep running. """
         if self.scene is None:
             return False
 
-        # Update the actual game logic.
+        timer = self.timer
         snapshot = self.inputs.update(self.frame)
+        if timer is not None:
+            timer.end_phase(INPUT)
         self.scene = self.scene.update(snapshot, self.images, self.sounds)
         self.frame += 1
+        if timer is not None:
+            timer.end_phase(UPDATE)
+
+        return self.scene is not None
 
+    def draw(self, context: RenderContext, interpolation: float):
+        """ Draws the scene, interpolation of the way from the previous step to the current one. """
         if self.scene is None:
-            return False
+            return
+
+        timer = self.timer
+        context.clear()
+        context.frame = self.frame
+        context.interpolation = interpolation
+        if timer is not None:
+            timer.end_phase(CLEAR)
+        self.scene.draw(context, self.images)
+        context.finish()
+        if timer is not None:
+            timer.end_phase(DRAW)
 
-        # Draw the scene.
-        self.render_context.clear()
-        self.scene.draw(self.render_context, self.images)
-        self.renderer.render(self.render_context)
+    def simulate(self, steps: int, interpolation: float, context: RenderContext) -> tuple[bool, bool]:
+        """ Runs steps of the game logic, and then draws into context.
+
+        Returns whether the game should keep running, and whether it drew.
+        """
+        for _ in range(steps):
+            if not self.update():
+                return (False, False)
+        if self.no_draw:
+            return (True, False)
+        self.draw(context, interpolation)
+        return (True, True)
 
-        return True
+    def render(self, context: RenderContext):
+        start = time.perf_counter_ns()
+        self.renderer.render(context)
+        if self.timer is not None:
+            # This is added separately, since it may overlap the other phases.
+            self.timer.add(RENDER, time.perf_counter_ns() - start)
 
     def main(self, args: Args):
         start_time = datetime.datetime.now()
+        step_time = 1.0 / FRAME_RATE
+        draw_time = 1.0 / MAX_DRAW_RATE
+        previous_time = time.perf_counter()
+        # How much time has passed that the game logic hasn't caught up with.
+        lag = 0.0
+        # With a simulation thread, one context is drawn into while the other
+        # is rendered from.
+        contexts = [self.render_context]
+        simulation: concurrent.futures.ThreadPoolExecutor | None = None
+        if args.pipelined:
+            contexts.append(self.create_render_context())
+            simulation = concurrent.futures.ThreadPoolExecutor(
+                1, 'simulation')
+        next_context = 0
+        drawn: RenderContext | None = None
         game_running = True
         while game_running:
+            frame_start = time.perf_counter()
             for event in pygame.event.get():
                 match event.type:
                     case pygame.QUIT:
@@ -105,19 +205,77 @@ class Game:
                         self.inputs.handle_joystick_event(event)
                     case (pygame.MOUSEMOTION | pygame.MOUSEBUTTONUP | pygame.MOUSEBUTTONDOWN):
                         self.inputs.handle_mouse_event(event)
-
-            if not self.update():
-                game_running = False
+            if not game_running:
+                break
 
             if args.speed_test:
+                # Run the game as fast as possible, with one step per draw.
+                steps = 1
                 self.clock.tick(0)
             else:
-                self.clock.tick(FRAME_RATE)
+                # Run the game logic at a fixed rate, no matter how long
+                # drawing takes, by running as many steps as have come due.
+                now = time.perf_counter()
+                lag += now - previous_time
+                previous_time = now
+                steps = int(lag // step_time)
+                if steps > MAX_STEPS_PER_FRAME:
+                    # Too far behind to catch up, so slow down instead.
+                    steps = MAX_STEPS_PER_FRAME
+                    lag = 0.0
+                else:
+                    lag -= steps * step_time
+            if args.frames is not None:
+                steps = min(steps, args.frames - self.frame)
+            interpolation = 1.0 if args.speed_test else lag / step_time
+
+            if self.timer is not None:
+                self.timer.start_frame()
+            context = contexts[next_context]
+            if simulation is not None:
+                # Render the last frame while the next one is simulated.
+                future = simulation.submit(
+                    self.simulate, steps, interpolation, context)
+                if drawn is not None:
+                    self.render(drawn)
+                    drawn = None
+                game_running, drew = future.result()
+                if drew:
+                    drawn = context
+                    next_context = (next_context + 1) % len(contexts)
+            else:
+                game_running, drew = self.simulate(
+                    steps, interpolation, context)
+                if drew:
+                    self.render(context)
+            if self.timer is not None and (steps > 0 or drew):
+                self.timer.end_frame()
+
+            if args.frames is not None and self.frame >= args.frames:
+                game_running = False
+
+            if not args.speed_test:
+                # Wait until the next step is due, or until it's time to draw
+                # the objects further along toward where that step puts them.
+                now = time.perf_counter()
+                remaining = step_time - lag - (now - previous_time)
+                if not self.no_draw:
+                    remaining = min(remaining, draw_time - (now - frame_start))
+                if remaining > 0:
+                    time.sleep(remaining)
+        if simulation is not None:
+            simulation.shutdown()
         end_time = datetime.datetime.now()
         duration = end_time - start_time
         fps = self.frame / duration.total_seconds()
         if args.speed_test:
             print(f"{fps} fps, {self.frame} frames in {duration.total_seconds()}s")
+            print(self.images)
+        if self.timer is not None:
+            print(self.timer)
+            if args.timings_path is not None:
+                self.timer.save(args.timings_path)
+        self.inputs.close()
         pygame.quit()
 
 
@@ -78,11 +78,19 @@ class Menu:
                     'tried to reload when level path not set')
             if self.previous is None:
                 raise Exception('tried to exit with empty scene stack')
+            # Restarting the level in place is much faster than reloading it.
+            if (isinstance(self.previous, level.Level) and
+                    self.previous.map_path == self.reload_path):
+                return self.previous.restart()
             return level.Level(self.previous.parent(), self.reload_path, self.images)
         else:
             raise Exception(f'invalid button action {action}')
 
     def update(self, inputs: InputSnapshot, images: ImageManager, sounds: SoundManager) -> Scene | None:
+        if isinstance(self.previous, level.Level):
+            # The level behind the menu is paused, but keeps animating.
+            self.previous.animate()
+
         if inputs.cancel:
             return self.perform_action(self.cancel_action)
 
@@ -108,6 +116,8 @@ class Menu:
         context.player_batch.draw_rect(context.logical_area, '#330033')
 
         if self.previous is not None:
+            # The scene behind the menu isn't moving, so draw it where it is.
+            context.interpolation = 1.0
             self.previous.draw(context, images)
 
         self.tilemap.draw_background(
@@ -0,0 +1,40 @@
+import unittest
+
+from render.opengl_renderer import TextureCache
+
+
+class FakeTexture:
+    freed: bool = False
+
+    def free(self):
+        self.freed = True
+
+
+class TestTextureCache(unittest.TestCase):
+    def test_keeps_unused_textures_for_grace_frames(self):
+        cache = TextureCache(grace_frames=3)
+        key = object()
+        texture = FakeTexture()
+        cache.add(key, texture)  # type: ignore[arg-type]
+        cache.free_unused()
+
+        for _ in range(2):
+            cache.free_unused()
+            self.assertFalse(texture.freed)
+        cache.free_unused()
+        self.assertTrue(texture.freed)
+        self.assertIsNone(cache.get(key))
+
+    def test_drawing_resets_grace_frames(self):
+        cache = TextureCache(grace_frames=2)
+        key = object()
+        texture = FakeTexture()
+        cache.add(key, texture)  # type: ignore[arg-type]
+        for _ in range(5):
+            cache.free_unused()
+            self.assertIs(texture, cache.get(key))
+        self.assertFalse(texture.freed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@
 import pygame
 
 from enum import Enum
-from random import randint
+from random import Random
 
 from constants import *
 from imagemanager import ImageManager
@@ -24,6 +24,9 @@ class PlayerState(Enum):
 class Player:
     x: int = 0
     y: int = 0
+    # Where the player was before the last step, to draw them in between.
+    previous_x: int = 0
+    previous_y: int = 0
     dx: int = 0
     dy: int = 0
     facing_right: bool = True
@@ -36,12 +39,33 @@ class Player:
     idle_counter: int = IDLE_TIME
     is_idle: bool = False
     is_dead: bool = False
+    # What to draw, which animate works out once per step.
+    sprite_index: int = 0
+    jiggle: tuple[int, int] = (0, 0)
+    random: Random
 
-    def __init__(self, images: ImageManager):
+    def __init__(self, images: ImageManager, random: Random):
+        self.random = random
         self.texture = images.load_image('assets/sprites/skelly.png')
         self.sprite = SpriteSheet(self.texture, 24, 24)
 
-    def draw(self, context: RenderContext, batch: SpriteBatch, pos: tuple[int, int]):
+    def save_state(self) -> tuple:
+        """ Returns the fields that change while the level is played. """
+        return (self.x, self.y, self.dx, self.dy, self.facing_right, self.state,
+                self.frame, self.frames_to_next_frame, self.idle_counter,
+                self.is_idle, self.is_dead)
+
+    def restore_state(self, state: tuple):
+        (self.x, self.y, self.dx, self.dy, self.facing_right, self.state,
+         self.frame, self.frames_to_next_frame, self.idle_counter,
+         self.is_idle, self.is_dead) = state
+        self.previous_x = self.x
+        self.previous_y = self.y
+        self.sprite_index = self.frame
+        self.jiggle = (0, 0)
+
+    def animate(self):
+        """ Advances the player's animation by one step. """
         if self.dx < 0:
             self.facing_right = False
         if self.dx > 0:
@@ -91,16 +115,22 @@ class Player:
             self.is_idle = False
             self.idle_counter = IDLE_TIME
 
-        if self.is_dead:
-            x_jiggle = randint(-SUBPIXELS, SUBPIXELS)
-            y_jiggle = randint(-SUBPIXELS, SUBPIXELS)
-            pos = (pos[0] + x_jiggle, pos[1] + y_jiggle)
+        self.sprite_index = index
+        self.jiggle = self.get_jiggle()
+
+    def get_jiggle(self) -> tuple[int, int]:
+        if not self.is_dead:
+            return (0, 0)
+        return (self.random.randint(-SUBPIXELS, SUBPIXELS),
+                self.random.randint(-SUBPIXELS, SUBPIXELS))
 
+    def draw(self, context: RenderContext, batch: SpriteBatch, pos: tuple[int, int]):
+        pos = (pos[0] + self.jiggle[0], pos[1] + self.jiggle[1])
         dest = pygame.Rect(pos[0], pos[1], 24 * SUBPIXELS, 24 * SUBPIXELS)
 
         self.sprite.blit(batch,
                          dest,
-                         index=index,
+                         index=self.sprite_index,
                          reverse=not self.facing_right)
 
         if False:
@@ -143,8 +173,8 @@ class Player:
 class Player2(Player):
     animation_state_machine: AnimationStateMachine
 
-    def __init__(self, images: ImageManager):
-        super().__init__(images)
+    def __init__(self, images: ImageManager, random: Random):
+        super().__init__(images, random)
 
         self.texture = images.load_image('assets/sprites/skelly2.png')
         self.sprite = SpriteSheet(self.texture, 24, 24)
@@ -152,7 +182,7 @@ class Player2(Player):
         f = open('assets/sprites/skelly2_states.txt')
         self.animation_state_machine = AnimationStateMachine(f.read())
 
-    def draw(self, context: RenderContext, batch: SpriteBatch, pos: tuple[int, int]):
+    def animate(self):
         if self.dx < 0:
             self.facing_right = False
         if self.dx > 0:
@@ -193,9 +223,7 @@ class Player2(Player):
 
         if self.is_dead:
             state = 'DEAD'
-            x_jiggle = randint(-SUBPIXELS, SUBPIXELS)
-            y_jiggle = randint(-SUBPIXELS, SUBPIXELS)
-            pos = (pos[0] + x_jiggle, pos[1] + y_jiggle)
+        self.jiggle = self.get_jiggle()
 
         if self.frames_to_next_frame == 0:
             self.frame = self.animation_state_machine.next_frame(
@@ -203,10 +231,4 @@ class Player2(Player):
             self.frames_to_next_frame = PLAYER_FRAMES_PER_FRAME
         else:
             self.frames_to_next_frame -= 1
-
-        dest = pygame.Rect(pos[0], pos[1], 24 * SUBPIXELS, 24 * SUBPIXELS)
-
-        self.sprite.blit(batch,
-                         dest,
-                         index=self.frame,
-                         reverse=not self.facing_right)
+        self.sprite_index = self.frame
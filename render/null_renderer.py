@@ -0,0 +1,15 @@
+import pygame
+
+from render.rendercontext import RenderContext
+
+
+class NullRenderer:
+    """ A renderer that doesn't present anything, for running without a display. """
+
+    def __init__(self, window: pygame.Rect):
+        # With the dummy video driver, this is just a surface, but having one
+        # means images get converted the same way they would in a window.
+        pygame.display.set_mode(window.size)
+
+    def render(self, context: RenderContext) -> None:
+        pass
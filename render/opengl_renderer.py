@@ -1,38 +1,279 @@
 # pyright: reportWildcardImportFromLibrary=false
 
-from random import randint
+import ctypes
+import sys
 import typing
 
+import numpy as np
 import pygame
 
 from OpenGL.GL import *
 from OpenGL.GL.shaders import compileShader
 
-from constants import SUBPIXELS
-from render.rendercontext import RenderContext
+from constants import FRAME_RATE, STATIC_NOISE_SEED, SUBPIXELS, TEXTURE_CACHE_GRACE_FRAMES
+from render.rendercontext import RenderContext, TileAtlas, TileGridDraw
+from render.vertexspritebatch import VertexSpriteBatch, VERTEX_SIZE
 
 
 class Texture:
+    """ A texture that's allocated once and then updated in place. """
     constant: Constant
     unit: int
     name: int
+    width: int
+    height: int
+    # Streaming textures upload through alternating pixel buffers, so that
+    # writing a new frame doesn't have to wait for the last one to finish.
+    pixel_buffers: list[int]
+    next_buffer: int
 
-    def __init__(self, constant: Constant, unit: int) -> None:
+    def __init__(self,
+                 constant: Constant,
+                 unit: int,
+                 size: tuple[int, int],
+                 repeat: bool = False,
+                 streaming: bool = False,
+                 nearest: bool = False) -> None:
         self.constant = constant
         self.unit = unit
+        self.width = size[0]
+        self.height = size[1]
         self.name = glGenTextures(1)
 
+        wrap = GL_REPEAT if repeat else GL_CLAMP
+        filter = GL_NEAREST if nearest else GL_LINEAR
+        self.bind()
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, filter)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, filter)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA,
+                     self.width,
+                     self.height,
+                     0, GL_RGBA, GL_UNSIGNED_BYTE,
+                     None)
+
+        self.pixel_buffers = []
+        self.next_buffer = 0
+        if streaming:
+            self.pixel_buffers = [int(buffer) for buffer in glGenBuffers(2)]
+
+    def bind(self):
+        glActiveTexture(self.constant)
+        glBindTexture(GL_TEXTURE_2D, self.name)
+
+    def update(self, data: typing.Any, format: Constant = GL_RGBA, row_length: int = 0):
+        """ Replaces the whole texture with rows of 32-bit pixels, top row first. """
+        self.bind()
+        glPixelStorei(GL_UNPACK_ROW_LENGTH, row_length)
+        try:
+            self.upload(data, format)
+        finally:
+            glPixelStorei(GL_UNPACK_ROW_LENGTH, 0)
+
+    def upload(self, data: typing.Any, format: Constant):
+        if len(self.pixel_buffers) == 0:
+            glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0,
+                            self.width, self.height,
+                            format, GL_UNSIGNED_BYTE,
+                            data)
+            return
+
+        buffer = self.pixel_buffers[self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % len(self.pixel_buffers)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, buffer)
+        # Orphan the old storage, so the driver doesn't wait for it.
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, len(data), None, GL_STREAM_DRAW)
+        glBufferSubData(GL_PIXEL_UNPACK_BUFFER, 0, len(data), data)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0,
+                        self.width, self.height,
+                        format, GL_UNSIGNED_BYTE,
+                        ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+
+    def update_area(self, area: pygame.Rect, data: typing.Any):
+        """ Replaces part of the texture with RGBA data. """
+        self.bind()
+        glTexSubImage2D(GL_TEXTURE_2D, 0, area.x, area.y, area.w, area.h,
+                        GL_RGBA, GL_UNSIGNED_BYTE, data)
+
     def free(self):
         glDeleteTextures([self.name])
+        if len(self.pixel_buffers) > 0:
+            glDeleteBuffers(len(self.pixel_buffers), self.pixel_buffers)
 
 
-class OpenGLRenderer:
+def get_pixel_format(surface: pygame.Surface) -> Constant | None:
+    """ Returns the GL format matching the surface's memory, if there is one. """
+    if surface.get_bytesize() != 4 or surface.get_pitch() % 4 != 0:
+        return None
+    masks = surface.get_masks()
+    if masks == (0x00ff0000, 0x0000ff00, 0x000000ff, 0xff000000):
+        return GL_BGRA if sys.byteorder == 'little' else None
+    if masks == (0x000000ff, 0x0000ff00, 0x00ff0000, 0xff000000):
+        return GL_RGBA if sys.byteorder == 'little' else None
+    return None
+
+
+def index_bytes(indices: np.ndarray) -> np.ndarray:
+    """ Returns tile indices as the RGBA bytes of little endian ints. """
+    return np.ascontiguousarray(indices, dtype='<u4').view(np.uint8)
+
+
+class Shader:
+    """ A linked shader program, with its uniform locations looked up once. """
     program: typing.Any
+    uniforms: dict[str, int]
+    # The last value passed to each uniform, so unchanged ones can be skipped.
+    uniform_values: dict[str, tuple]
+
+    def __init__(self,
+                 vert_path: str,
+                 frag_path: str,
+                 uniforms: list[str],
+                 attributes: list[str] = []):
+        frag_src = open(frag_path)
+        frag_shader = compileShader(frag_src, GL_FRAGMENT_SHADER)
+
+        vert_src = open(vert_path)
+        vert_shader = compileShader(vert_src, GL_VERTEX_SHADER)
+
+        program = glCreateProgram()
+        self.program = program
+        glAttachShader(program, frag_shader)
+        glAttachShader(program, vert_shader)
+        # Attributes are bound to locations in the order they're listed.
+        for i, name in enumerate(attributes):
+            glBindAttribLocation(program, i, name)
+        glLinkProgram(program)
+
+        self.uniforms = {}
+        self.uniform_values = {}
+        for name in uniforms:
+            self.uniforms[name] = glGetUniformLocation(program, name)
+
+    def use(self):
+        glUseProgram(self.program)
+
+    def set_uniform(self, name: str, setter: typing.Callable, *value: typing.Any):
+        """ Sets the uniform, unless it already has the given value. """
+        if self.uniform_values.get(name) == value:
+            return
+        self.uniform_values[name] = value
+        setter(self.uniforms[name], *value)
+
+
+class TextureCache:
+    """ Textures for objects the renderer draws, freed once they stop being drawn for a while. """
+    # Indexed by the id of the object, which is kept so the id stays unique.
+    textures: dict[int, tuple[typing.Any, Texture]]
+    # The frame each texture was last drawn in, by the id of its object.
+    last_used: dict[int, int]
+    frame: int
+    # How many frames a texture is kept after it was last drawn, so that
+    # objects that flicker in and out of view aren't uploaded over and over.
+    grace_frames: int
+
+    def __init__(self, grace_frames: int = TEXTURE_CACHE_GRACE_FRAMES):
+        self.textures = {}
+        self.last_used = {}
+        self.frame = 0
+        self.grace_frames = grace_frames
+
+    def get(self, key: typing.Any) -> Texture | None:
+        entry = self.textures.get(id(key))
+        if entry is None:
+            return None
+        self.last_used[id(key)] = self.frame
+        return entry[1]
+
+    def add(self, key: typing.Any, texture: Texture):
+        self.textures[id(key)] = (key, texture)
+        self.last_used[id(key)] = self.frame
+
+    def free_unused(self):
+        """ Frees the textures that weren't drawn in the last grace_frames frames. """
+        for key in list(self.textures.keys()):
+            if self.frame - self.last_used[key] >= self.grace_frames:
+                self.textures.pop(key)[1].free()
+                del self.last_used[key]
+        self.frame += 1
+
+
+# Every uniform in shader.frag. Their locations are looked up once.
+UNIFORMS = [
+    'iTime',
+    'iResolution',
+    'iOffset',
+    'iTextureSize',
+    'iStaticTexture',
+    'iSceneTexture',
+    'iHudTexture',
+    'iDark',
+    'iSpotlightCount',
+    'iSpotlightPosition',
+    'iSpotlightRadius',
+]
+
+# Every uniform in tiles.frag.
+TILE_UNIFORMS = [
+    'iPosition',
+    'iGridSize',
+    'iTileSize',
+    'iAtlasSize',
+    'iAtlasColumns',
+    'iIndexTexture',
+    'iAtlasTexture',
+]
+
+# Every uniform in sprites.vert and sprites.frag.
+SPRITE_UNIFORMS = [
+    'iCanvasSize',
+    'iTexture',
+]
+
+# The attributes of each vertex in a VertexSpriteBatch.
+SPRITE_ATTRIBUTES = [
+    'aPosition',
+    'aTexCoord',
+    'aColor',
+]
+
+
+class OpenGLRenderer:
+    shader: Shader
+    tile_shader: Shader
+    sprite_shader: Shader
+    # Vertex array objects, if the context has them, and the buffers for the
+    # full screen quad and for sprite batches.
+    quad_array: typing.Any
+    quad_buffer: typing.Any
+    sprite_array: typing.Any
+    sprite_buffer: typing.Any
     logical_rect: pygame.Rect
     destination_rect: pygame.Rect
     window_rect: pygame.Rect
 
     static_texture: Texture
+    player_texture: Texture
+    hud_texture: Texture
+
+    # The player layer is composited with the tile grids into the scene,
+    # which the main shader then draws to the screen.
+    scene_texture: Texture
+    scene_framebuffer: typing.Any
+    # A grid with one tile, for drawing the player surface as if it were an atlas.
+    single_tile_texture: Texture
+    atlas_textures: TextureCache
+    grid_textures: TextureCache
+
+    # Vertex batches draw the hud directly into the hud texture.
+    hud_framebuffer: typing.Any
+    # The surfaces drawn by vertex batches, and a white pixel for solid colors.
+    sprite_textures: TextureCache
+    white_texture: Texture
+    # The pixels of the shared surfaces in the context being rendered.
+    pixels: dict[int, bytes]
 
     def __init__(self,
                  logical: pygame.Rect,
@@ -50,86 +291,174 @@ class OpenGLRenderer:
         glViewport(0, 0, window.w, window.h)
         glEnable(GL_BLEND)
         glEnable(GL_TEXTURE_2D)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        # Keep track of coverage in the alpha channel, so that the hud can be
+        # drawn over the scene after being drawn into its own texture.
+        glBlendFuncSeparate(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA,
+                            GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
 
-        self.static_texture = Texture(GL_TEXTURE1, 1)
+        size = self.logical_rect.size
+        self.player_texture = Texture(GL_TEXTURE0, 0, size, streaming=True)
+        self.static_texture = Texture(GL_TEXTURE1, 1, size, repeat=True)
+        self.hud_texture = Texture(GL_TEXTURE2, 2, size, streaming=True)
 
+        self.pixels = {}
         self.init_static()
+        self.init_scene()
+        self.init_sprites()
         self.init_shader()
 
-    def set_texture_data(self, texture: Texture, surface: pygame.Surface, repeat: bool = False):
-        wrap = GL_REPEAT if repeat else GL_CLAMP
-        texture_data = pygame.image.tobytes(surface, 'RGBA', True)
-        glActiveTexture(texture.constant)
-        glBindTexture(GL_TEXTURE_2D, texture.name)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA,
-                     self.logical_rect.w,
-                     self.logical_rect.h,
-                     0, GL_RGBA, GL_UNSIGNED_BYTE,
-                     texture_data)
+    def set_texture_data(self, texture: Texture, surface: pygame.Surface):
+        # The shader flips the textures vertically, so rows can be uploaded in
+        # the same order pygame stores them.
+        format = get_pixel_format(surface)
+        if format is None:
+            # Surfaces without per-pixel alpha, like converted images, have to
+            # be copied into a format GL can read, with an opaque alpha.
+            surface = surface.convert(pygame.Surface((1, 1), pygame.SRCALPHA))
+            format = get_pixel_format(surface)
+            if format is None:
+                raise Exception('unable to convert surface for upload')
+
+        # Upload straight from the surface's pixels, without copying them.
+        # The buffer locks the surface, so it has to be released before the
+        # next frame draws to it. Only the context's own surfaces can be
+        # uploaded this way, since nothing else draws from them meanwhile.
+        buffer = np.frombuffer(surface.get_buffer(), dtype=np.uint8)  # type: ignore
+        try:
+            texture.update(buffer, format,
+                           surface.get_pitch() // surface.get_bytesize())
+        finally:
+            del buffer
+
+    def set_shared_texture_data(self, texture: Texture, surface: pygame.Surface):
+        """ Uploads a surface the game may be drawing from, from the copy the context took. """
+        texture.update(self.pixels[id(surface)])
 
     def init_static(self):
         print('initializing static')
-        self.static = pygame.Surface(self.logical_rect.size)
-        for x in range(self.logical_rect.w):
-            for y in range(self.logical_rect.h):
-                r = randint(0, 255)
-                g = randint(0, 255)
-                b = randint(0, 255)
-                color = pygame.Color(r, g, b)
-                self.static.set_at((x, y), color)
-
-        self.set_texture_data(self.static_texture, self.static, repeat=True)
+        random = np.random.default_rng(STATIC_NOISE_SEED)
+        w, h = self.logical_rect.size
+        noise = random.integers(0, 256, (h, w, 4), dtype=np.uint8)
+        # The static is opaque, and the shader blends its alpha in too.
+        noise[..., 3] = 255
+        self.static_texture.update(noise)
+
+    def create_framebuffer(self, texture: Texture) -> typing.Any:
+        framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0,
+                               GL_TEXTURE_2D, texture.name, 0)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise Exception('unable to create framebuffer')
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        return framebuffer
+
+    def init_scene(self):
+        print('initializing scene')
+        self.scene_texture = Texture(GL_TEXTURE3, 3, self.logical_rect.size)
+        self.scene_framebuffer = self.create_framebuffer(self.scene_texture)
+
+        self.single_tile_texture = Texture(
+            GL_TEXTURE4, 4, (1, 1), nearest=True)
+        self.single_tile_texture.update(index_bytes(np.ones((1, 1))))
+        self.atlas_textures = TextureCache()
+        self.grid_textures = TextureCache()
+
+    def init_sprites(self):
+        print('initializing sprites')
+        self.hud_framebuffer = self.create_framebuffer(self.hud_texture)
+        self.sprite_textures = TextureCache()
+        self.white_texture = Texture(GL_TEXTURE6, 6, (1, 1), nearest=True)
+        self.white_texture.update(np.full(4, 255, dtype=np.uint8))
 
     def set_constant_inputs(self):
-        res = glGetUniformLocation(self.program, 'iResolution')
-        glUniform2f(res, self.destination_rect.w, self.destination_rect.h)
-
-        offset = glGetUniformLocation(self.program, 'iOffset')
-        glUniform2f(offset,
-                    (self.window_rect.w - self.destination_rect.w) / 2.0,
-                    (self.window_rect.h - self.destination_rect.h) / 2.0)
-
-        glUniform1i(glGetUniformLocation(self.program, 'iStaticTexture'),
-                    self.static_texture.unit)
+        self.shader.use()
+        self.shader.set_uniform('iResolution', glUniform2f,
+                                self.destination_rect.w, self.destination_rect.h)
+        self.shader.set_uniform('iOffset', glUniform2f,
+                                (self.window_rect.w - self.destination_rect.w) / 2.0,
+                                (self.window_rect.h - self.destination_rect.h) / 2.0)
+
+        self.shader.set_uniform('iStaticTexture', glUniform1i,
+                                self.static_texture.unit)
+        self.shader.set_uniform('iHudTexture', glUniform1i,
+                                self.hud_texture.unit)
+        self.shader.set_uniform('iSceneTexture', glUniform1i,
+                                self.scene_texture.unit)
+
+        self.sprite_shader.use()
+        self.sprite_shader.set_uniform('iTexture', glUniform1i,
+                                       self.white_texture.unit)
 
     def init_shader(self):
         print('initializing shader')
-        frag_src = open('./shader.frag')
-        frag_shader = compileShader(frag_src, GL_FRAGMENT_SHADER)
-
-        vert_src = open('./shader.vert')
-        vert_shader = compileShader(vert_src, GL_VERTEX_SHADER)
-
-        program = glCreateProgram()
-        self.program = program
-        glAttachShader(program, frag_shader)
-        glAttachShader(program, vert_shader)
-        glLinkProgram(program)
-        glUseProgram(program)
-
+        self.shader = Shader('./shader.vert', './shader.frag', UNIFORMS)
+        self.tile_shader = Shader('./shader.vert', './tiles.frag', TILE_UNIFORMS)
+        self.sprite_shader = Shader('./sprites.vert', './sprites.frag',
+                                    SPRITE_UNIFORMS, SPRITE_ATTRIBUTES)
         self.set_constant_inputs()
+        self.init_vertices()
 
-        vertices = [
+    def init_vertices(self):
+        vertices = np.array([
             -1.0, 1.0,
             -1.0, -1.0,
             1.0, -1.0,
             1.0, 1.0,
-        ]
+        ], dtype=np.float32)
+        self.quad_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.quad_buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes,
+                     vertices, GL_STATIC_DRAW)
+        self.sprite_buffer = glGenBuffers(1)
+
+        # Vertex array objects aren't available on every legacy context.
+        # Without them, the attributes are set up again whenever they change.
+        self.quad_array = None
+        self.sprite_array = None
+        if bool(glGenVertexArrays):
+            self.sprite_array = glGenVertexArrays(1)
+            glBindVertexArray(self.sprite_array)
+            self.set_sprite_attributes()
+            self.quad_array = glGenVertexArrays(1)
+            glBindVertexArray(self.quad_array)
+        self.set_quad_attributes()
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def set_quad_attributes(self):
+        glBindBuffer(GL_ARRAY_BUFFER, self.quad_buffer)
         glEnableVertexAttribArray(0)
-        glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, 0, vertices)
+        glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+        if self.sprite_array is None:
+            glDisableVertexAttribArray(1)
+            glDisableVertexAttribArray(2)
+
+    def set_sprite_attributes(self):
+        glBindBuffer(GL_ARRAY_BUFFER, self.sprite_buffer)
+        stride = VERTEX_SIZE * 4
+        for i, (size, offset) in enumerate([(2, 0), (2, 2), (4, 4)]):
+            glEnableVertexAttribArray(i)
+            glVertexAttribPointer(i, size, GL_FLOAT, GL_FALSE,
+                                  stride, ctypes.c_void_p(offset * 4))
+
+    def use_quad_vertices(self):
+        if self.quad_array is not None:
+            glBindVertexArray(self.quad_array)
+        else:
+            self.set_quad_attributes()
+
+    def use_sprite_vertices(self):
+        if self.sprite_array is not None:
+            glBindVertexArray(self.sprite_array)
+        else:
+            self.set_sprite_attributes()
 
     def set_shader_inputs(self, context: RenderContext):
-        glUniform1f(glGetUniformLocation(self.program, 'iTime'),
-                    pygame.time.get_ticks() / 1000.0)
-        glUniform2f(glGetUniformLocation(self.program, 'iTextureSize'),
-                    context.render_size[0], context.render_size[1])
-        glUniform1i(glGetUniformLocation(self.program, 'iDark'),
-                    context.dark)
+        self.shader.set_uniform('iTime', glUniform1f,
+                                context.frame / FRAME_RATE)
+        self.shader.set_uniform('iTextureSize', glUniform2f,
+                                context.render_size[0], context.render_size[1])
+        self.shader.set_uniform('iDark', glUniform1i, context.dark)
 
         ls = context.lights
         if len(ls) > 20:
@@ -140,36 +469,190 @@ class OpenGLRenderer:
             for l in ls]
         radii = [l.radius // SUBPIXELS for l in ls]
 
-        glUniform1i(glGetUniformLocation(
-            self.program, 'iSpotlightCount'), len(ls))
-
-        glUniform2fv(glGetUniformLocation(self.program, 'iSpotlightPosition'),
-                     len(ls), positions)
+        self.shader.set_uniform('iSpotlightCount', glUniform1i, len(ls))
+        if len(ls) > 0:
+            self.shader.set_uniform('iSpotlightPosition', glUniform2fv,
+                                    len(ls), positions)
+            self.shader.set_uniform('iSpotlightRadius', glUniform1fv,
+                                    len(ls), radii)
+
+    def get_atlas_texture(self, atlas: TileAtlas) -> Texture:
+        texture = self.atlas_textures.get(atlas)
+        if texture is None:
+            texture = Texture(GL_TEXTURE5, 5,
+                              atlas.surface.get_size(), nearest=True)
+            self.set_shared_texture_data(texture, atlas.surface)
+            self.atlas_textures.add(atlas, texture)
+        return texture
+
+    def get_grid_texture(self, draw: TileGridDraw) -> Texture:
+        """ Returns the grid's indices as a texture, uploading any that changed. """
+        # This only reads the indices from the draw, since the grid itself may
+        # be changing on another thread.
+        texture = self.grid_textures.get(draw.grid)
+        if texture is None:
+            rows, cols = draw.indices.shape
+            texture = Texture(GL_TEXTURE4, 4, (cols, rows), nearest=True)
+            texture.update(index_bytes(draw.indices))
+            self.grid_textures.add(draw.grid, texture)
+        elif draw.dirty is not None:
+            area = draw.dirty
+            indices = draw.indices[area.top:area.bottom, area.left:area.right]
+            texture.update_area(area, index_bytes(indices))
+        return texture
+
+    def draw_grid(self,
+                  index_texture: Texture,
+                  atlas_texture: Texture,
+                  tile_size: tuple[int, int],
+                  columns: int,
+                  position: tuple[int, int]):
+        index_texture.bind()
+        atlas_texture.bind()
+        self.tile_shader.set_uniform('iIndexTexture', glUniform1i,
+                                     index_texture.unit)
+        self.tile_shader.set_uniform('iAtlasTexture', glUniform1i,
+                                     atlas_texture.unit)
+        self.tile_shader.set_uniform('iPosition', glUniform2f,
+                                     position[0], position[1])
+        self.tile_shader.set_uniform('iGridSize', glUniform2f,
+                                     index_texture.width, index_texture.height)
+        self.tile_shader.set_uniform('iTileSize', glUniform2f,
+                                     tile_size[0], tile_size[1])
+        self.tile_shader.set_uniform('iAtlasSize', glUniform2f,
+                                     atlas_texture.width, atlas_texture.height)
+        self.tile_shader.set_uniform('iAtlasColumns', glUniform1f, columns)
+        glDrawArrays(GL_QUADS, 0, 4)
 
-        glUniform1fv(glGetUniformLocation(self.program, 'iSpotlightRadius'),
-                     len(ls), radii)
+    def draw_tile_grid(self, draw: TileGridDraw):
+        grid = draw.grid
+        atlas = grid.atlas
+        rows, cols = draw.indices.shape
+        bounds = pygame.Rect(
+            draw.position[0],
+            draw.position[1],
+            cols * atlas.tile_size[0],
+            rows * atlas.tile_size[1])
+        if not bounds.colliderect(self.logical_rect):
+            # The changes still have to be uploaded, since they won't be
+            # part of the next draw.
+            if draw.dirty is not None:
+                self.get_grid_texture(draw)
+            return
+        self.draw_grid(self.get_grid_texture(draw),
+                       self.get_atlas_texture(atlas),
+                       atlas.tile_size,
+                       atlas.columns,
+                       draw.position)
+
+    def get_sprite_texture(self, surface: pygame.Surface | None) -> Texture:
+        if surface is None:
+            return self.white_texture
+        texture = self.sprite_textures.get(surface)
+        if texture is None:
+            texture = Texture(GL_TEXTURE6, 6,
+                              surface.get_size(), nearest=True)
+            self.set_shared_texture_data(texture, surface)
+            self.sprite_textures.add(surface, texture)
+        return texture
+
+    def upload_batch(self, batch: VertexSpriteBatch):
+        vertices = np.frombuffer(batch.vertices, dtype=np.float32)
+        glBindBuffer(GL_ARRAY_BUFFER, self.sprite_buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes,
+                     vertices, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw_batch(self, batch: VertexSpriteBatch):
+        """ Draws every quad in the batch, with one draw call per run. """
+        if len(batch.runs) == 0:
+            return
+        self.upload_batch(batch)
+        self.draw_uploaded_batch(batch, 0, batch.vertex_count)
+
+    def draw_uploaded_batch(self, batch: VertexSpriteBatch, start: int, end: int):
+        """ Draws the uploaded vertices from start to end, with one draw call per run. """
+        if start >= end:
+            return
+        self.sprite_shader.use()
+        self.sprite_shader.set_uniform('iCanvasSize', glUniform2f,
+                                       batch.size[0], batch.size[1])
+        self.use_sprite_vertices()
+        for run in batch.runs:
+            first = max(run.first, start)
+            last = min(run.first + run.count, end)
+            if first >= last:
+                continue
+            self.get_sprite_texture(run.texture).bind()
+            glDrawArrays(GL_TRIANGLES, first, last - first)
+        self.use_quad_vertices()
+
+    def render_hud(self, batch: VertexSpriteBatch):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.hud_framebuffer)
+        glViewport(0, 0, self.logical_rect.w, self.logical_rect.h)
+        glClearColor(0, 0, 0, 0)
+        glClear(GL_COLOR_BUFFER_BIT)
+        self.draw_batch(batch)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glViewport(0, 0, self.window_rect.w, self.window_rect.h)
+
+    def render_scene(self, context: RenderContext):
+        """ Draws the tile grids and the player surface into the scene texture. """
+        glBindFramebuffer(GL_FRAMEBUFFER, self.scene_framebuffer)
+        glViewport(0, 0, self.logical_rect.w, self.logical_rect.h)
+        color = context.background_color or pygame.Color(0, 0, 0, 0)
+        glClearColor(color.r / 255.0, color.g / 255.0,
+                     color.b / 255.0, color.a / 255.0)
+        glClear(GL_COLOR_BUFFER_BIT)
+
+        self.tile_shader.use()
+        if isinstance(context.player_batch, VertexSpriteBatch):
+            # Each grid goes on top of the sprites drawn before it, such as
+            # the animated tiles from the layers underneath it.
+            batch = context.player_batch
+            self.upload_batch(batch)
+            drawn = 0
+            for draw in context.background_grids + context.foreground_grids:
+                if draw.vertices_before > drawn:
+                    self.draw_uploaded_batch(
+                        batch, drawn, draw.vertices_before)
+                    self.tile_shader.use()
+                    drawn = draw.vertices_before
+                self.draw_tile_grid(draw)
+            self.draw_uploaded_batch(batch, drawn, batch.vertex_count)
+        else:
+            for draw in context.background_grids:
+                self.draw_tile_grid(draw)
+            self.draw_grid(self.single_tile_texture,
+                           self.player_texture,
+                           self.logical_rect.size,
+                           1,
+                           (0, 0))
+            for draw in context.foreground_grids:
+                self.draw_tile_grid(draw)
+
+        self.atlas_textures.free_unused()
+        self.grid_textures.free_unused()
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glViewport(0, 0, self.window_rect.w, self.window_rect.h)
 
     def render(self, context: RenderContext):
+        self.pixels = context.pixels
+        if isinstance(context.hud_batch, VertexSpriteBatch):
+            self.render_hud(context.hud_batch)
+        else:
+            self.set_texture_data(self.hud_texture, context.hud_surface)
+        if not isinstance(context.player_batch, VertexSpriteBatch):
+            self.set_texture_data(self.player_texture, context.player_surface)
+        self.render_scene(context)
+        self.sprite_textures.free_unused()
+
         glClearColor(0, 0, 1, 1)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)  # type: ignore
 
+        self.shader.use()
         self.set_shader_inputs(context)
-
-        hud_texture = Texture(GL_TEXTURE2, 2)
-        self.set_texture_data(hud_texture, context.hud_surface)
-        glUniform1i(glGetUniformLocation(self.program, 'iHudTexture'),
-                    hud_texture.unit)
-
-        player_texture = Texture(GL_TEXTURE0, 0)
-        self.set_texture_data(player_texture, context.player_surface)
-        glUniform1i(glGetUniformLocation(self.program, 'iPlayerTexture'),
-                    player_texture.unit)
-
-        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        self.scene_texture.bind()
         glDrawArrays(GL_QUADS, 0, 4)
-        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
-
-        hud_texture.free()
-        player_texture.free()
 
         pygame.display.flip()
@@ -1,8 +1,11 @@
 
+import numpy as np
 import pygame
+import weakref
 
 from constants import SUBPIXELS
-from render.spritebatch import SpriteBatch
+from render.spritebatch import SpriteBatch, SurfaceSpriteBatch
+from render.vertexspritebatch import VertexSpriteBatch
 
 
 class Light:
@@ -14,6 +17,92 @@ class Light:
         self.radius = radius
 
 
+class TileAtlas:
+    """ Every tile a map can draw, packed into rows of one surface. """
+    surface: pygame.Surface
+    tile_size: tuple[int, int]
+    columns: int
+
+    def __init__(self, surface: pygame.Surface, tile_size: tuple[int, int], columns: int):
+        self.surface = surface
+        self.tile_size = tile_size
+        self.columns = columns
+
+
+class TileGrid:
+    """ A layer of tiles that the renderer draws itself, from an atlas. """
+    atlas: TileAtlas
+    # For each cell, the index of its tile in the atlas plus one, or 0 if
+    # the cell is empty. Indexed by [row, col]. This is replaced instead of
+    # modified once the grid has been drawn, since a draw may still be
+    # rendering from the old one on another thread.
+    indices: np.ndarray
+    # The cells that have changed since the grid was last drawn.
+    dirty: pygame.Rect | None
+
+    def __init__(self, atlas: TileAtlas, indices: np.ndarray):
+        self.atlas = atlas
+        self.indices = indices
+        self.dirty = None
+
+    def mark_dirty(self, area: pygame.Rect):
+        if self.dirty is None:
+            self.dirty = area
+        else:
+            self.dirty = self.dirty.union(area)
+
+    def set_cells(self, rows: np.ndarray, cols: np.ndarray, values: np.ndarray, area: pygame.Rect):
+        """ Sets the cells at rows and cols to values, where area covers all of them. """
+        indices = self.indices.copy()
+        indices[rows, cols] = values
+        self.indices = indices
+        self.mark_dirty(area)
+
+    def take_dirty(self) -> pygame.Rect | None:
+        dirty = self.dirty
+        self.dirty = None
+        return dirty
+
+
+class TileGridDraw:
+    grid: TileGrid
+    position: tuple[int, int]  # in pixels
+    # The grid's indices and changed cells as of when it was drawn.
+    indices: np.ndarray
+    dirty: pygame.Rect | None
+    # How many vertices were in the player batch when the grid was drawn, so
+    # that they can be drawn underneath it and the rest on top.
+    vertices_before: int
+
+    def __init__(self, grid: TileGrid, position: tuple[int, int], vertices_before: int = 0):
+        self.grid = grid
+        self.position = position
+        self.indices = grid.indices
+        self.dirty = grid.take_dirty()
+        self.vertices_before = vertices_before
+
+
+class PixelCache:
+    """ Copies of the pixels of shared surfaces, for the renderer to upload.
+
+    Reading a surface's buffer locks it, and the game may be blitting from the
+    same surface on another thread, so the renderer only uploads these copies.
+    Shared surfaces are replaced instead of modified, so each one is copied once.
+    """
+    pixels: weakref.WeakKeyDictionary[pygame.Surface, bytes]
+
+    def __init__(self):
+        self.pixels = weakref.WeakKeyDictionary()
+
+    def get(self, surface: pygame.Surface) -> bytes:
+        """ Returns the surface's pixels as RGBA bytes, top row first. """
+        data = self.pixels.get(surface)
+        if data is None:
+            data = pygame.image.tobytes(surface, 'RGBA')
+            self.pixels[surface] = data
+        return data
+
+
 class RenderContext:
     render_size: tuple[int, int]
     render_area: pygame.Rect
@@ -25,10 +114,31 @@ class RenderContext:
     hud_batch: SpriteBatch
     player_batch: SpriteBatch
 
+    # The number of frames since the game started, to use as a clock.
+    frame: int = 0
+    # How far between the previous step of the game and the current one to
+    # draw moving objects, from 0.0 to 1.0.
+    interpolation: float = 1.0
+
     dark: bool = False
     lights: list[Light]
 
-    def __init__(self, render_size: tuple[int, int]):
+    # Whether tile maps should be drawn as tile grids instead of into batches.
+    draw_tile_grids: bool = False
+    background_color: pygame.Color | None
+    # The grids to draw behind and in front of the player surface.
+    background_grids: list[TileGridDraw]
+    foreground_grids: list[TileGridDraw]
+
+    pixel_cache: PixelCache
+    # The pixels of every shared surface drawn since the last clear, keyed by
+    # the id of the surface, so the renderer never has to read the surface.
+    pixels: dict[int, bytes]
+
+    def __init__(self,
+                 render_size: tuple[int, int],
+                 vertex_batches: bool = False,
+                 pixel_cache: PixelCache | None = None):
         self.render_size: tuple[int, int] = render_size
         self.render_area = pygame.Rect(0, 0, render_size[0], render_size[1])
         self.logical_area = pygame.Rect(
@@ -39,20 +149,85 @@ class RenderContext:
         self.player_surface = pygame.Surface(render_size, pygame.SRCALPHA)
         self.background_surface = pygame.Surface(render_size, pygame.SRCALPHA)
 
-        self.hud_batch = SpriteBatch(self.hud_surface)
-        self.foreground_batch = SpriteBatch(self.foreground_surface)
-        self.player_batch = SpriteBatch(self.player_surface)
-        self.background_batch = SpriteBatch(self.background_surface)
+        # Vertex batches are drawn by the renderer, instead of onto the surfaces.
+        if vertex_batches:
+            self.hud_batch = VertexSpriteBatch(render_size)
+            self.player_batch = VertexSpriteBatch(render_size)
+        else:
+            self.hud_batch = SurfaceSpriteBatch(self.hud_surface)
+            self.player_batch = SurfaceSpriteBatch(self.player_surface)
+        self.foreground_batch = SurfaceSpriteBatch(self.foreground_surface)
+        self.background_batch = SurfaceSpriteBatch(self.background_surface)
 
         self.lights = []
+        self.background_color = None
+        self.background_grids = []
+        self.foreground_grids = []
+        self.pixel_cache = pixel_cache or PixelCache()
+        self.pixels = {}
 
     def clear(self):
         self.lights.clear()
-        black = pygame.Color(0, 0, 0, 0)
-        self.background_surface.fill(black, self.render_area)
-        self.player_surface.fill(black, self.render_area)
-        self.foreground_surface.fill(black, self.render_area)
-        self.hud_surface.fill(black, self.render_area)
+        self.background_color = None
+        self.background_grids.clear()
+        self.foreground_grids.clear()
+        self.background_batch.clear()
+        self.player_batch.clear()
+        self.foreground_batch.clear()
+        self.hud_batch.clear()
+        self.pixels = {}
+
+    def finish(self):
+        """ Draws everything recorded in the batches onto their surfaces, before rendering. """
+        self.background_batch.finish()
+        self.player_batch.finish()
+        self.foreground_batch.finish()
+        self.hud_batch.finish()
+        self.take_pixels()
+
+    def take_pixels(self):
+        """ Gets the pixels of the surfaces the renderer draws from, for uploading them. """
+        for batch in [self.player_batch, self.hud_batch]:
+            if isinstance(batch, VertexSpriteBatch):
+                for run in batch.runs:
+                    if run.texture is not None:
+                        self.add_pixels(run.texture)
+        for draw in self.background_grids + self.foreground_grids:
+            self.add_pixels(draw.grid.atlas.surface)
+
+    def add_pixels(self, surface: pygame.Surface):
+        key = id(surface)
+        if key not in self.pixels:
+            self.pixels[key] = self.pixel_cache.get(surface)
 
     def add_light(self, position: tuple[int, int], radius: float):
         self.lights.append(Light(position, radius))
+
+    def fill_background(self, color: pygame.Color):
+        """ Covers everything drawn so far in the player layer with color. """
+        self.background_color = color
+        # The grids won't be rendered, so give back any changes they took.
+        for draw in self.background_grids + self.foreground_grids:
+            if draw.dirty is not None:
+                draw.grid.mark_dirty(draw.dirty)
+        self.background_grids.clear()
+        self.foreground_grids.clear()
+        self.player_batch.clear()
+
+    def grids_interleave(self) -> bool:
+        """ Whether sprites in the player batch are drawn in between the grids around them.
+
+        Otherwise, the whole batch is drawn after the background grids and
+        before the foreground grids.
+        """
+        return isinstance(self.player_batch, VertexSpriteBatch)
+
+    def add_tile_grid(self, grid: TileGrid, position: tuple[int, int], foreground: bool):
+        vertices_before = 0
+        if isinstance(self.player_batch, VertexSpriteBatch):
+            vertices_before = self.player_batch.vertex_count
+        draw = TileGridDraw(grid, position, vertices_before)
+        if foreground:
+            self.foreground_grids.append(draw)
+        else:
+            self.background_grids.append(draw)
@@ -1,22 +1,103 @@
 
+import array
 import pygame
+import typing
+import weakref
 
 from constants import SUBPIXELS
 
+COMMAND_SIZE = 7
 
-class SpriteBatch:
+
+class SpriteBatch(typing.Protocol):
+    def draw(self,
+             texture: pygame.Surface,
+             dest: pygame.Rect,
+             src: pygame.Rect | None = None,
+             reverse: bool = False) -> None:
+        """ Draws src from texture at dest, flipped horizontally if reverse is set. """
+        raise Exception('abstract base class')
+
+    def draw_rect(self, dest: pygame.Rect, color: pygame.Color | str) -> None:
+        raise Exception('abstract base class')
+
+    def clear(self) -> None:
+        raise Exception('abstract base class')
+
+    def finish(self) -> None:
+        raise Exception('abstract base class')
+
+
+class SurfaceSpriteBatch:
+    """ A sprite batch that records draws, and plays them onto a surface when finished. """
     canvas: pygame.Surface
+    # Each command is the texture index, or -1 minus the color index for a
+    # filled rect, then the x, y, w, and h of dest and the x and y of src, in
+    # pixels. Blits use the size of dest for src.
+    commands: array.array
+    textures: list[pygame.Surface]
+    # The index of each texture in textures, by id.
+    texture_indices: dict[int, int]
+    colors: list[pygame.Color]
+    # Flipped copies of the textures drawn in reverse, made the first time each is needed.
+    flipped: weakref.WeakKeyDictionary[pygame.Surface, pygame.Surface]
+    # What was last played onto the canvas, so an unchanged frame can be skipped.
+    played_commands: array.array | None
+    played_textures: list[pygame.Surface]
+    played_colors: list[pygame.Color]
+    # How many draws were left out of the last frame for being off the canvas.
+    culled: int
+    # Whether the last frame was skipped for being the same as the one before.
+    skipped: bool
 
     def __init__(self, canvas: pygame.Surface):
         self.canvas = canvas
+        self.commands = array.array('i')
+        self.textures = []
+        self.texture_indices = {}
+        self.colors = []
+        self.flipped = weakref.WeakKeyDictionary()
+        self.played_commands = None
+        self.played_textures = []
+        self.played_colors = []
+        self.culled = 0
+        self.skipped = False
+
+    @property
+    def command_count(self) -> int:
+        return len(self.commands) // COMMAND_SIZE
 
     def draw(self,
              texture: pygame.Surface,
              dest: pygame.Rect,
-             src: pygame.Rect | None = None):
+             src: pygame.Rect | None = None,
+             reverse: bool = False):
+        # Like blit, this ignores the size of dest and uses the size of src.
         s = SUBPIXELS
-        dest = pygame.Rect(dest.x//s, dest.y//s, dest.w//s, dest.h//s)
-        self.canvas.blit(texture, dest, area=src)
+        if src is None:
+            src = texture.get_rect()
+        x = dest.x // s
+        y = dest.y // s
+        if not self.canvas.get_rect().colliderect(x, y, src.w, src.h):
+            self.culled += 1
+            return
+        if reverse:
+            texture, src = self.flip(texture, src)
+        index = self.texture_indices.get(id(texture))
+        if index is None:
+            index = len(self.textures)
+            self.textures.append(texture)
+            self.texture_indices[id(texture)] = index
+        self.commands.extend((index, x, y, src.w, src.h, src.x, src.y))
+
+    def flip(self, texture: pygame.Surface, src: pygame.Rect) -> tuple[pygame.Surface, pygame.Rect]:
+        """ Returns the flipped copy of texture, and where src ended up in it. """
+        flipped = self.flipped.get(texture)
+        if flipped is None:
+            flipped = pygame.transform.flip(texture, True, False)
+            self.flipped[texture] = flipped
+        x = texture.get_width() - src.right
+        return flipped, pygame.Rect(x, src.y, src.w, src.h)
 
     def draw_rect(self, dest: pygame.Rect, color: pygame.Color | str):
         if dest.bottom < 0:
@@ -25,4 +106,52 @@ class SpriteBatch:
             dest = pygame.Rect(dest.x, 0, dest.w, dest.h + dest.y)
         s = SUBPIXELS
         dest = pygame.Rect(dest.x//s, dest.y//s, dest.w//s, dest.h//s)
-        self.canvas.fill(color, dest)
+        if not self.canvas.get_rect().colliderect(dest):
+            self.culled += 1
+            return
+        self.colors.append(pygame.Color(color))
+        self.commands.extend(
+            (-len(self.colors), dest.x, dest.y, dest.w, dest.h, 0, 0))
+
+    def clear(self):
+        self.commands = array.array('i')
+        self.textures = []
+        self.texture_indices = {}
+        self.colors = []
+        self.culled = 0
+
+    def is_unchanged(self) -> bool:
+        """ Returns whether the commands would draw the same thing as last time. """
+        # Surfaces that change are replaced rather than drawn into, so the
+        # same surfaces will have the same pixels.
+        return (self.commands == self.played_commands and
+                self.colors == self.played_colors and
+                len(self.textures) == len(self.played_textures) and
+                all(a is b for a, b in zip(self.textures, self.played_textures)))
+
+    def finish(self):
+        """ Plays the recorded commands onto the canvas, unless they haven't changed. """
+        self.skipped = self.is_unchanged()
+        if self.skipped:
+            return
+        self.played_commands = self.commands
+        self.played_textures = self.textures
+        self.played_colors = self.colors
+
+        self.canvas.fill(pygame.Color(0, 0, 0, 0))
+        # Runs of blits are handed to pygame all at once, which is much faster
+        # than blitting them one at a time.
+        blits: list[tuple[pygame.Surface, tuple[int, int], pygame.Rect]] = []
+        commands = self.commands
+        for i in range(0, len(commands), COMMAND_SIZE):
+            index, x, y, w, h, src_x, src_y = commands[i:i+COMMAND_SIZE]
+            if index >= 0:
+                blits.append((self.textures[index], (x, y),
+                              pygame.Rect(src_x, src_y, w, h)))
+                continue
+            if len(blits) > 0:
+                self.canvas.blits(blits, False)
+                blits = []
+            self.canvas.fill(self.colors[-1 - index], (x, y, w, h))
+        if len(blits) > 0:
+            self.canvas.blits(blits, False)
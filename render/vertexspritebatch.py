@@ -0,0 +1,118 @@
+
+import array
+import pygame
+
+from constants import SUBPIXELS
+
+# Each vertex is x, y in pixels, u, v in texture coordinates, and r, g, b, a.
+VERTEX_SIZE = 8
+VERTICES_PER_QUAD = 6
+
+
+class SpriteRun:
+    """ Consecutive quads in a batch that all use the same texture. """
+    # The root surface to sample, or None for solid colors.
+    texture: pygame.Surface | None
+    first: int
+    count: int
+
+    def __init__(self, texture: pygame.Surface | None, first: int):
+        self.texture = texture
+        self.first = first
+        self.count = 0
+
+
+class VertexSpriteBatch:
+    """ A sprite batch that records quads, for the renderer to draw all at once. """
+    size: tuple[int, int]
+    vertices: array.array
+    runs: list[SpriteRun]
+
+    def __init__(self, size: tuple[int, int]):
+        self.size = size
+        self.vertices = array.array('f')
+        self.runs = []
+
+    def clear(self):
+        self.vertices = array.array('f')
+        self.runs.clear()
+
+    def finish(self):
+        # The renderer draws the vertices itself.
+        pass
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.vertices) // VERTEX_SIZE
+
+    def add_quad(self,
+                 texture: pygame.Surface | None,
+                 dest: pygame.Rect,
+                 uv: tuple[float, float, float, float],
+                 color: tuple[float, float, float, float]):
+        if len(self.runs) == 0 or self.runs[-1].texture is not texture:
+            self.runs.append(SpriteRun(texture, self.vertex_count))
+        self.runs[-1].count += VERTICES_PER_QUAD
+
+        left, top, right, bottom = dest.left, dest.top, dest.right, dest.bottom
+        u0, v0, u1, v1 = uv
+        r, g, b, a = color
+        self.vertices.extend((
+            left, top, u0, v0, r, g, b, a,
+            right, top, u1, v0, r, g, b, a,
+            right, bottom, u1, v1, r, g, b, a,
+            left, top, u0, v0, r, g, b, a,
+            right, bottom, u1, v1, r, g, b, a,
+            left, bottom, u0, v1, r, g, b, a,
+        ))
+
+    def is_visible(self, dest: pygame.Rect) -> bool:
+        return (dest.right > 0 and dest.bottom > 0 and
+                dest.left < self.size[0] and dest.top < self.size[1])
+
+    def draw(self,
+             texture: pygame.Surface,
+             dest: pygame.Rect,
+             src: pygame.Rect | None = None,
+             reverse: bool = False):
+        # Like blit, this ignores the size of dest and uses the size of src.
+        s = SUBPIXELS
+        x = dest.x // s
+        y = dest.y // s
+        bounds = texture.get_rect()
+        area = bounds if src is None else src.clip(bounds)
+        if area.w <= 0 or area.h <= 0:
+            return
+        if src is not None:
+            x += (src.right - area.right) if reverse else (area.x - src.x)
+            y += area.y - src.y
+        quad = pygame.Rect(x, y, area.w, area.h)
+        if not self.is_visible(quad):
+            return
+
+        # Subsurfaces are drawn from their parent, so that every image in a
+        # texture atlas shares a single texture.
+        root = texture.get_abs_parent()
+        offset_x, offset_y = texture.get_abs_offset()
+        width, height = root.get_size()
+        uv = ((area.left + offset_x) / width,
+              (area.top + offset_y) / height,
+              (area.right + offset_x) / width,
+              (area.bottom + offset_y) / height)
+        if reverse:
+            # Flipping the texture coordinates mirrors the quad in place.
+            uv = (uv[2], uv[1], uv[0], uv[3])
+        self.add_quad(root, quad, uv, (1.0, 1.0, 1.0, 1.0))
+
+    def draw_rect(self, dest: pygame.Rect, color: pygame.Color | str):
+        if dest.bottom < 0:
+            return
+        if dest.y < 0:
+            dest = pygame.Rect(dest.x, 0, dest.w, dest.h + dest.y)
+        s = SUBPIXELS
+        quad = pygame.Rect(dest.x//s, dest.y//s, dest.w//s, dest.h//s)
+        if quad.w <= 0 or quad.h <= 0 or not self.is_visible(quad):
+            return
+        c = pygame.Color(color)
+        self.add_quad(None, quad, (0.0, 0.0, 1.0, 1.0),
+                      (c.r / 255.0, c.g / 255.0, c.b / 255.0, c.a / 255.0))
@@ -0,0 +1,35 @@
+import pygame
+import unittest
+
+from constants import SUBPIXELS
+from render.rendercontext import PixelCache, RenderContext
+
+
+class TestPixels(unittest.TestCase):
+    def test_takes_pixels_of_drawn_surfaces(self):
+        cache = PixelCache()
+        contexts = [RenderContext((320, 180), True, cache) for _ in range(2)]
+        atlas = pygame.Surface((16, 8), pygame.SRCALPHA)
+        atlas.fill((10, 20, 30, 40))
+        image = atlas.subsurface(pygame.Rect(8, 0, 8, 8))
+
+        for context in contexts:
+            context.clear()
+            context.player_batch.draw(image, pygame.Rect(0, 0, 0, 0))
+            context.player_batch.draw_rect(
+                pygame.Rect(0, 0, 8 * SUBPIXELS, 8 * SUBPIXELS), 'red')
+            context.finish()
+            self.assertEqual([id(atlas)], list(context.pixels))
+            self.assertEqual(pygame.image.tobytes(atlas, 'RGBA'),
+                             context.pixels[id(atlas)])
+
+        # The contexts share one copy of the pixels.
+        self.assertIs(contexts[0].pixels[id(atlas)],
+                      contexts[1].pixels[id(atlas)])
+
+        contexts[0].clear()
+        self.assertEqual({}, contexts[0].pixels)
+
+
+if __name__ == '__main__':
+    unittest.main()
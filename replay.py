@@ -0,0 +1,86 @@
+import mmap
+import numpy as np
+import struct
+import typing
+
+# Binary replays start with a header, followed by the path of the level they
+# were recorded in, padded to a multiple of 8 bytes. After that, each record is
+# a little-endian uint64 frame number and a uint64 encoded InputSnapshot, for
+# every frame where the inputs changed, in order.
+REPLAY_MAGIC = b'PURPYREC'
+REPLAY_VERSION = 1
+REPLAY_EXTENSION = '.replay'
+HEADER_FORMAT = struct.Struct('<8sIqI')
+RECORD_FORMAT = struct.Struct('<QQ')
+
+
+class ReplayHeader(typing.NamedTuple):
+    # The level that was being played when the recording started, if known.
+    level_path: str
+    # The seed for the level's random numbers.
+    seed: int
+
+
+class ReplayData:
+    """ The records of a binary replay, mapped into memory. """
+    header: ReplayHeader
+    # Sequences of the frame numbers and the snapshots for them.
+    frames: typing.Sequence[int]
+    snapshots: typing.Sequence[int]
+    data: mmap.mmap | None
+    view: memoryview
+    records: np.ndarray | None
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, seed, path_size = HEADER_FORMAT.unpack_from(self.data)
+        if magic != REPLAY_MAGIC:
+            raise Exception(f'not a replay file: {path}')
+        if version != REPLAY_VERSION:
+            raise Exception(f'unsupported replay version {version}: {path}')
+        level_path = bytes(
+            self.data[HEADER_FORMAT.size:HEADER_FORMAT.size+path_size])
+        self.header = ReplayHeader(level_path.decode('utf-8'), seed)
+
+        start = header_size(path_size)
+        count = (len(self.data) - start) // RECORD_FORMAT.size
+        end = start + count * RECORD_FORMAT.size
+        self.view = memoryview(self.data)[start:end]
+        # The records are always little-endian, whatever this machine uses.
+        self.records = np.frombuffer(self.view, dtype='<u8').reshape(-1, 2)
+        self.frames = typing.cast(typing.Sequence[int], self.records[:, 0])
+        self.snapshots = typing.cast(
+            typing.Sequence[int], self.records[:, 1])
+
+    def close(self):
+        # The views have to be released before the map can be closed.
+        self.frames = []
+        self.snapshots = []
+        self.records = None
+        self.view.release()
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+
+def header_size(path_size: int) -> int:
+    return (HEADER_FORMAT.size + path_size + 7) // 8 * 8
+
+
+def is_replay(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(REPLAY_MAGIC)) == REPLAY_MAGIC
+
+
+def write_header(f: typing.BinaryIO, header: ReplayHeader):
+    level_path = header.level_path.encode('utf-8')
+    f.write(HEADER_FORMAT.pack(REPLAY_MAGIC, REPLAY_VERSION,
+            header.seed, len(level_path)))
+    f.write(level_path)
+    f.write(bytes(header_size(len(level_path)) -
+            HEADER_FORMAT.size - len(level_path)))
+
+
+def write_record(f: typing.BinaryIO, frame: int, snapshot: int):
+    f.write(RECORD_FORMAT.pack(frame, snapshot))
@@ -8,7 +8,7 @@ uniform vec2 iTextureSize;
 
 // Textures
 uniform sampler2D iStaticTexture;
-uniform sampler2D iPlayerTexture;
+uniform sampler2D iSceneTexture;
 uniform sampler2D iHudTexture;
 
 // Lighting
@@ -77,15 +77,20 @@ vec4 spotlight(vec2 position) {
     return vec4(0.0, 0.0, 0.0, alpha);
 }
 
+// Textures are uploaded top row first, so they have to be flipped vertically.
+vec2 flip_uv(vec2 uv) {
+    return vec2(uv.x, 1.0 - uv.y);
+}
+
 // Like texture2D, but fuzzes partway between linear and nearest.
 vec4 sample_texture(sampler2D texture, vec2 uv) {
-    return texture2D(texture, fuzz_sample_uv(uv));
+    return texture2D(texture, flip_uv(fuzz_sample_uv(uv)));
 }
 
 vec4 get_scene_pixel(vec2 uv) {
     vec4 spot = spotlight(uv);
 
-    vec4 player_color = sample_texture(iPlayerTexture, uv);
+    vec4 player_color = sample_texture(iSceneTexture, uv);
     player_color = vec4(mix(player_color.rgb, spot.rgb, spot.a), 1.0);
 
     vec4 hud_color = sample_texture(iHudTexture, uv);
@@ -109,7 +114,7 @@ void main() {
 
     vec2 random_pos = uv1;
     random_pos.y += iTime * 10.0;
-    vec4 random = texture2D(iStaticTexture, random_pos);
+    vec4 random = texture2D(iStaticTexture, flip_uv(random_pos));
 
     vec4 color1 = get_scene_pixel(uv1);
     vec4 color2 = get_scene_pixel(uv2);
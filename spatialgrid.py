@@ -0,0 +1,85 @@
+import pygame
+import typing
+
+T = typing.TypeVar('T')
+
+CellRange = tuple[int, int, int, int]
+
+
+class SpatialGrid(typing.Generic[T]):
+    """ Buckets objects into a uniform grid, to quickly find the ones near a rect. """
+    cell_size: int
+    cells: dict[tuple[int, int], list[T]]
+    # The left, top, right, and bottom cells that each object is in, by id.
+    ranges: dict[int, CellRange]
+    # The order the objects were added in, by id, so queries are deterministic.
+    order: dict[int, int]
+    added: int
+
+    def __init__(self, cell_size: int):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.ranges = {}
+        self.order = {}
+        self.added = 0
+
+    def __len__(self) -> int:
+        return len(self.ranges)
+
+    def get_range(self, rect: pygame.Rect) -> CellRange:
+        # This includes the cells touching the right and bottom edges, so that
+        # objects that are only touching are still found.
+        s = self.cell_size
+        return (rect.left // s, rect.top // s, rect.right // s, rect.bottom // s)
+
+    def add_to_cells(self, obj: T, cells: CellRange):
+        left, top, right, bottom = cells
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                self.cells.setdefault((row, col), []).append(obj)
+
+    def remove_from_cells(self, obj: T, cells: CellRange):
+        left, top, right, bottom = cells
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                cell = self.cells[(row, col)]
+                cell.remove(obj)
+                if len(cell) == 0:
+                    del self.cells[(row, col)]
+
+    def insert(self, obj: T, rect: pygame.Rect):
+        cells = self.get_range(rect)
+        self.ranges[id(obj)] = cells
+        self.order[id(obj)] = self.added
+        self.added += 1
+        self.add_to_cells(obj, cells)
+
+    def remove(self, obj: T):
+        cells = self.ranges.pop(id(obj))
+        del self.order[id(obj)]
+        self.remove_from_cells(obj, cells)
+
+    def update(self, obj: T, rect: pygame.Rect):
+        """ Moves obj to rect, which only touches the grid if it changed cells. """
+        cells = self.get_range(rect)
+        previous = self.ranges[id(obj)]
+        if cells == previous:
+            return
+        self.remove_from_cells(obj, previous)
+        self.add_to_cells(obj, cells)
+        self.ranges[id(obj)] = cells
+
+    def query(self, rect: pygame.Rect) -> list[T]:
+        """ Returns every object that might touch rect, in the order they were added. """
+        left, top, right, bottom = self.get_range(rect)
+        found: dict[int, T] = {}
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                cell = self.cells.get((row, col))
+                if cell is not None:
+                    for obj in cell:
+                        found[id(obj)] = obj
+        if len(found) < 2:
+            return list(found.values())
+        order = self.order
+        return sorted(found.values(), key=lambda obj: order[id(obj)])
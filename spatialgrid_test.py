@@ -0,0 +1,45 @@
+import pygame
+import unittest
+
+from spatialgrid import SpatialGrid
+
+
+class Thing:
+    name: str
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class TestSpatialGrid(unittest.TestCase):
+
+    def test_query_finds_nearby(self):
+        grid: SpatialGrid[Thing] = SpatialGrid(10)
+        a = Thing('a')
+        b = Thing('b')
+        c = Thing('c')
+        grid.insert(a, pygame.Rect(0, 0, 5, 5))
+        grid.insert(b, pygame.Rect(5, 5, 30, 5))
+        grid.insert(c, pygame.Rect(100, 100, 5, 5))
+        self.assertEqual([a, b], grid.query(pygame.Rect(2, 2, 5, 5)))
+        self.assertEqual([b], grid.query(pygame.Rect(30, 5, 1, 1)))
+        self.assertEqual([c], grid.query(pygame.Rect(95, 95, 5, 5)))
+        self.assertEqual([], grid.query(pygame.Rect(50, 50, 5, 5)))
+
+    def test_update_and_remove(self):
+        grid: SpatialGrid[Thing] = SpatialGrid(10)
+        a = Thing('a')
+        b = Thing('b')
+        grid.insert(a, pygame.Rect(0, 0, 5, 5))
+        grid.insert(b, pygame.Rect(50, 0, 5, 5))
+        grid.update(a, pygame.Rect(52, 0, 5, 5))
+        self.assertEqual([], grid.query(pygame.Rect(0, 0, 5, 5)))
+        # Results stay in the order things were added, even after moving.
+        self.assertEqual([a, b], grid.query(pygame.Rect(50, 0, 5, 5)))
+        grid.remove(a)
+        self.assertEqual([b], grid.query(pygame.Rect(50, 0, 5, 5)))
+        self.assertEqual(1, len(grid))
+
+
+if __name__ == '__main__':
+    unittest.main()
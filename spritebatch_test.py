@@ -0,0 +1,92 @@
+import pygame
+import unittest
+
+from constants import SUBPIXELS
+from render.spritebatch import SurfaceSpriteBatch
+
+
+def rect(x: int, y: int, w: int, h: int) -> pygame.Rect:
+    s = SUBPIXELS
+    return pygame.Rect(x * s, y * s, w * s, h * s)
+
+
+def sprite(color: str) -> pygame.Surface:
+    surface = pygame.Surface((8, 8), pygame.SRCALPHA)
+    surface.fill(color)
+    return surface
+
+
+class TestSurfaceSpriteBatch(unittest.TestCase):
+    def test_matches_blitting(self):
+        canvas = pygame.Surface((32, 32), pygame.SRCALPHA)
+        batch = SurfaceSpriteBatch(canvas)
+        red = sprite('red')
+        blue = sprite('blue')
+        batch.draw(red, rect(0, 0, 8, 8))
+        batch.draw_rect(rect(4, 4, 8, 8), 'green')
+        batch.draw(blue, rect(8, 8, 8, 8), pygame.Rect(4, 4, 4, 4))
+        batch.draw(red, rect(10, 10, 8, 8))
+        self.assertEqual(4, batch.command_count)
+        self.assertEqual([red, blue], batch.textures)
+        batch.finish()
+
+        expected = pygame.Surface((32, 32), pygame.SRCALPHA)
+        expected.fill(pygame.Color(0, 0, 0, 0))
+        expected.blit(red, (0, 0))
+        expected.fill('green', (4, 4, 8, 8))
+        expected.blit(blue, (8, 8), pygame.Rect(4, 4, 4, 4))
+        expected.blit(red, (10, 10))
+        self.assertEqual(pygame.image.tobytes(expected, 'RGBA'),
+                         pygame.image.tobytes(canvas, 'RGBA'))
+
+    def test_reverse(self):
+        canvas = pygame.Surface((32, 32), pygame.SRCALPHA)
+        batch = SurfaceSpriteBatch(canvas)
+        sheet = pygame.Surface((16, 8), pygame.SRCALPHA)
+        sheet.fill('red', (0, 0, 4, 8))
+        sheet.fill('blue', (4, 0, 4, 8))
+        sheet.fill('green', (8, 0, 8, 8))
+        batch.draw(sheet, rect(0, 0, 8, 8), pygame.Rect(0, 0, 8, 8), True)
+        batch.draw(sheet, rect(8, 0, 8, 8), pygame.Rect(0, 0, 8, 8), True)
+        # The flipped copy is made once, and reused.
+        self.assertEqual(1, len(batch.textures))
+        batch.finish()
+        self.assertEqual(pygame.Color('blue'), canvas.get_at((0, 0)))
+        self.assertEqual(pygame.Color('red'), canvas.get_at((4, 0)))
+        self.assertEqual(pygame.Color('blue'), canvas.get_at((8, 0)))
+
+    def test_offscreen_is_culled(self):
+        batch = SurfaceSpriteBatch(pygame.Surface((32, 32), pygame.SRCALPHA))
+        surface = sprite('red')
+        batch.draw(surface, rect(-8, 0, 8, 8))
+        batch.draw(surface, rect(32, 0, 8, 8))
+        batch.draw_rect(rect(0, -8, 8, 8), 'red')
+        batch.draw_rect(rect(0, 40, 8, 8), 'red')
+        self.assertEqual(0, batch.command_count)
+        self.assertEqual(4, batch.culled)
+
+    def test_unchanged_frames_are_skipped(self):
+        canvas = pygame.Surface((32, 32), pygame.SRCALPHA)
+        batch = SurfaceSpriteBatch(canvas)
+        red = sprite('red')
+        batch.draw(red, rect(0, 0, 8, 8))
+        batch.finish()
+        self.assertFalse(batch.skipped)
+
+        batch.clear()
+        batch.draw(red, rect(0, 0, 8, 8))
+        batch.finish()
+        self.assertTrue(batch.skipped)
+        self.assertEqual(pygame.Color('red'), canvas.get_at((0, 0)))
+
+        # A different surface with the same position still has to be drawn.
+        batch.clear()
+        batch.draw(sprite('blue'), rect(0, 0, 8, 8))
+        batch.finish()
+        self.assertFalse(batch.skipped)
+        self.assertEqual(pygame.Color('blue'), canvas.get_at((0, 0)))
+
+        batch.clear()
+        batch.finish()
+        self.assertFalse(batch.skipped)
+        self.assertEqual(pygame.Color(0, 0, 0, 0), canvas.get_at((0, 0)))
@@ -0,0 +1,10 @@
+#version 120
+
+uniform sampler2D iTexture;
+
+varying vec2 vTexCoord;
+varying vec4 vColor;
+
+void main() {
+    gl_FragColor = texture2D(iTexture, vTexCoord) * vColor;
+}
@@ -0,0 +1,18 @@
+#version 120
+
+// The size of the texture being drawn into, in pixels.
+uniform vec2 iCanvasSize;
+
+attribute vec2 aPosition;
+attribute vec2 aTexCoord;
+attribute vec4 aColor;
+
+varying vec2 vTexCoord;
+varying vec4 vColor;
+
+void main() {
+    // Canvases are stored top row first, so the top of the canvas is at -1.
+    gl_Position = vec4((aPosition / iCanvasSize) * 2.0 - 1.0, 0.0, 1.0);
+    vTexCoord = aTexCoord;
+    vColor = aColor;
+}
@@ -7,7 +7,6 @@ from render.spritebatch import SpriteBatch
 
 class SpriteSheet:
     surface: pygame.Surface
-    reverse: pygame.Surface
     sprite_width: int
     sprite_height: int
     columns: int
@@ -16,14 +15,11 @@ class SpriteSheet:
         self.sprite_width = sprite_width
         self.sprite_height = sprite_height
         self.surface = surface
-        self.reverse = pygame.transform.flip(surface, True, False)
         self.columns = surface.get_width() // sprite_width
 
-    def sprite(self, index: int, layer: int, reverse: bool) -> pygame.Rect:
+    def sprite(self, index: int, layer: int) -> pygame.Rect:
         column = index % self.columns
         row = index // self.columns
-        if reverse:
-            column = (self.columns - 1) - column
         row += layer
         x = column * self.sprite_width
         y = row * self.sprite_height
@@ -35,11 +31,10 @@ class SpriteSheet:
              index: int = 0,
              layer: int = 0,
              reverse: bool = False):
-        texture = self.surface
-        if reverse:
-            texture = self.reverse
-        sprite = self.sprite(index, layer, reverse)
-        batch.draw(texture, dest, sprite)
+        # Reversed sprites are flipped by the batch, so they share the
+        # surface, and its place in the texture atlas.
+        sprite = self.sprite(index, layer)
+        batch.draw(self.surface, dest, sprite, reverse)
 
 
 class Animation:
@@ -63,8 +58,14 @@ class Animation:
         else:
             self.timer -= 1
 
+    def save_state(self) -> tuple[int, int]:
+        return (self.index, self.timer)
+
+    def restore_state(self, state: tuple[int, int]):
+        self.index, self.timer = state
+
     def blit(self, batch: SpriteBatch, dest: pygame.Rect, reverse: bool):
-        self.spritesheet.blit(batch, dest, self.index, reverse)
+        self.spritesheet.blit(batch, dest, self.index, reverse=reverse)
 
 
 class AnimationStateMachineRule:
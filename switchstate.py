@@ -1,18 +1,23 @@
-
 class SwitchState:
     on: set[str]
+    # This is incremented every time the set of switches that are on changes.
+    version: int
 
     def __init__(self):
         self.on = set()
+        self.version = 0
 
     def turn_on(self, s: str):
         print(f'turning on {s}')
-        self.on.add(s)
+        if s not in self.on:
+            self.on.add(s)
+            self.version += 1
 
     def turn_off(self, s: str):
         print(f'turning off {s}')
         if s in self.on:
             self.on.remove(s)
+            self.version += 1
 
     def toggle(self, s: str):
         print(f'toggling {s}')
@@ -20,6 +25,13 @@ class SwitchState:
             self.on.remove(s)
         else:
             self.on.add(s)
+        self.version += 1
+
+    def restore(self, on: set[str]):
+        """ Sets which switches are on, as a new version. """
+        self.on = set(on)
+        # Never reuse an old version, since caches compare against it.
+        self.version += 1
 
     def is_on(self, s: str) -> bool:
         return s in self.on
@@ -37,3 +49,10 @@ class SwitchState:
             return not self.is_on(s[1:])
         else:
             return self.is_on(s)
+
+
+def condition_switch(condition: str) -> str:
+    """ Returns the name of the switch that a condition depends on. """
+    if condition[0] == '!':
+        return condition[1:]
+    return condition
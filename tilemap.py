@@ -1,17 +1,25 @@
 
+import base64
+import gzip
 import math
+import numpy as np
 import os.path
 import pygame
+import typing
 import xml.etree.ElementTree
+import zlib
 
-from constants import SUBPIXELS, MAX_GRAVITY
+import levelcache
+
+from constants import SPATIAL_GRID_CELL_SIZE, SUBPIXELS, MAX_GRAVITY, TILE_CHUNK_SIZE, USE_LEVEL_CACHE
 from imagemanager import ImageManager
 from properties import load_properties, set_defaults, MapObjectProperties, MapProperties, TileProperties
-from render.rendercontext import RenderContext
+from render.rendercontext import RenderContext, TileAtlas, TileGrid
 from render.spritebatch import SpriteBatch
 from slope import Slope
+from spatialgrid import SpatialGrid
 from spritesheet import Animation
-from switchstate import SwitchState
+from switchstate import SwitchState, condition_switch
 from tileset import TileSet, load_tileset
 from utils import cmp_in_direction, intersect, try_move_to_bounds, Direction
 
@@ -19,12 +27,31 @@ from utils import cmp_in_direction, intersect, try_move_to_bounds, Direction
 class ImageLayer:
     path: str
     surface: pygame.Surface
+    grid: TileGrid | None
 
     def __init__(self, node: xml.etree.ElementTree.Element, path: str, images: ImageManager):
         image = [img for img in node if img.tag == 'image']
         source = image[0].attrib['source']
         self.path = os.path.join(os.path.dirname(path), source)
+        self.load_images(images)
+
+    def load_images(self, images: ImageManager):
         self.surface = images.load_image(self.path)
+        self.grid = None
+
+    def __getstate__(self):
+        # Surfaces can't be pickled, so they have to be reloaded with load_images.
+        state = self.__dict__.copy()
+        del state['surface']
+        del state['grid']
+        return state
+
+    def get_tile_grid(self) -> TileGrid:
+        """ Returns the image as a grid with a single tile. """
+        if self.grid is None:
+            atlas = TileAtlas(self.surface, self.surface.get_size(), 1)
+            self.grid = TileGrid(atlas, np.ones((1, 1), dtype=np.uint32))
+        return self.grid
 
 
 class TileLayer:
@@ -32,7 +59,7 @@ class TileLayer:
     name: str
     width: int
     height: int
-    data: list[list[int]]
+    data: np.ndarray  # uint32 gids, indexed by [row, col]
     player: bool
 
     def __init__(self, node: xml.etree.ElementTree.Element):
@@ -54,18 +81,98 @@ class TileLayer:
                     if value == 'true':
                         self.player = True
 
-        self.data = []
-        csv = (
-            [data for data in node if data.tag == 'data'][0].text or ""
-        ).strip()
-        indices = [int(index.strip()) for index in csv.split(',')]
+        data = [data for data in node if data.tag == 'data'][0]
+        indices = load_layer_data(data)
         if len(indices) != self.width * self.height:
-            raise Exception('csv size does not match')
-        for i in range(self.height):
-            row: list[int] = []
-            for j in range(self.width):
-                row.append(indices[i * self.width + j])
-            self.data.append(row)
+            raise Exception('layer data size does not match')
+        self.data = indices.reshape((self.height, self.width))
+
+
+def decompress_layer_data(raw: bytes, compression: str | None) -> bytes:
+    match compression:
+        case None | '':
+            return raw
+        case 'zlib':
+            return zlib.decompress(raw)
+        case 'gzip':
+            return gzip.decompress(raw)
+        case 'zstd':
+            try:
+                import zstandard  # type: ignore[import-not-found]
+            except ImportError:
+                raise Exception('zstd compressed maps require zstandard')
+            return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    raise Exception(f'unsupported layer compression {compression}')
+
+
+def load_layer_data(node: xml.etree.ElementTree.Element) -> np.ndarray:
+    """ Returns the gids in a layer's data node, as a flat uint32 array. """
+    text = (node.text or "").strip()
+    encoding = node.attrib.get('encoding')
+    if encoding == 'csv':
+        return np.array(text.split(','), dtype=np.uint32)
+    if encoding == 'base64':
+        raw = decompress_layer_data(
+            base64.b64decode(text), node.attrib.get('compression'))
+        return np.frombuffer(raw, dtype='<u4').astype(np.uint32)
+    raise Exception(f'unsupported layer encoding {encoding}')
+
+
+class TileChunk:
+    """ A square block of tiles from one layer, pre-rendered to a surface. """
+    row: int
+    col: int
+    surface: pygame.Surface | None
+    # The switch conditions used by tiles in this chunk, and what they were
+    # when the surface was rendered, so it can be redrawn when they change.
+    conditions: list[str]
+    condition_values: list[bool]
+    # Animated tiles are drawn on top of the surface every frame.
+    animated: list[tuple[int, int]]
+
+    def __init__(self, row: int, col: int):
+        self.row = row
+        self.col = col
+        self.surface = None
+        self.conditions = []
+        self.condition_values = []
+        self.animated = []
+
+
+class GridCondition:
+    """ The cells of a tile grid that depend on one switch condition. """
+    rows: np.ndarray
+    cols: np.ndarray
+    bounds: pygame.Rect  # in cells
+    # The atlas indices to use in those cells when the condition is true or false.
+    true_indices: np.ndarray
+    false_indices: np.ndarray
+    # What the condition was when the grid was last updated.
+    value: bool | None
+
+    def __init__(self, rows: np.ndarray, cols: np.ndarray, true_indices: np.ndarray, false_indices: np.ndarray):
+        self.rows = rows
+        self.cols = cols
+        top = int(rows.min())
+        left = int(cols.min())
+        self.bounds = pygame.Rect(
+            left, top, int(cols.max()) + 1 - left, int(rows.max()) + 1 - top)
+        self.true_indices = true_indices
+        self.false_indices = false_indices
+        self.value = None
+
+
+class TileGridLayer:
+    """ A tile layer as a grid for the renderer, and what's needed to keep it up to date. """
+    grid: TileGrid
+    conditions: dict[str, GridCondition]
+    # Animated tiles aren't in the grid, so they're drawn into the batch.
+    animated: list[tuple[int, int]]
+
+    def __init__(self, grid: TileGrid):
+        self.grid = grid
+        self.conditions = {}
+        self.animated = []
 
 
 class MapObject:
@@ -98,10 +205,57 @@ class MapObject:
     def rect(self) -> pygame.Rect:
         return pygame.Rect(self.x, self.y, self.width, self.height)
 
+    def scaled_rect(self) -> pygame.Rect:
+        """ Returns the rect in subpixels. """
+        return pygame.Rect(self.x * SUBPIXELS, self.y * SUBPIXELS,
+                           self.width * SUBPIXELS, self.height * SUBPIXELS)
+
     def __repr__(self):
         return f'MapObject(id={self.id}, gid={self.gid}, x={self.x}, y={self.y}, w={self.width}, h={self.height}, properties={self.properties}'
 
 
+class TileInfo:
+    """ Everything about a single tile gid, resolved when the map is loaded. """
+    gid: int
+    tileset: TileSet
+    tile_id: int
+    source: pygame.Rect
+    properties: TileProperties
+    slope: Slope | None
+    animation: Animation | None
+    alternate: 'TileInfo | None'
+
+    def __init__(self, tileset: TileSet, tile_id: int):
+        self.gid = tileset.get_global_index(tile_id)
+        self.tileset = tileset
+        self.tile_id = tile_id
+        self.source = tileset.get_source_rect(tile_id)
+        self.properties = tileset.get_tile_properties(tile_id)
+        self.slope = tileset.slopes.get(tile_id)
+        self.animation = tileset.animations.get(tile_id)
+        self.alternate = None
+
+
+class CollisionTile:
+    """ A solid tile the player can run into, with its hitbox in sub-pixels. """
+    gid: int
+    bounds: pygame.Rect
+    oneway: str | None
+    slope: Slope | None
+
+    def __init__(self, tile: TileInfo, tile_bounds: pygame.Rect):
+        props = tile.properties
+        self.gid = tile.gid
+        self.bounds = pygame.Rect(
+            tile_bounds.x + props.hitbox_left * SUBPIXELS,
+            tile_bounds.y + props.hitbox_top * SUBPIXELS,
+            tile_bounds.w +
+            (props.hitbox_left+props.hitbox_right) * SUBPIXELS,
+            tile_bounds.h + (props.hitbox_top+props.hitbox_bottom) * SUBPIXELS)
+        self.oneway = props.oneway
+        self.slope = tile.slope
+
+
 class TileSetList:
     tilesets: list[TileSet]
 
@@ -119,20 +273,76 @@ class TileSetList:
                 return (tileset, tile_id)
         raise Exception(f"invalid tile_id {tile_gid}")
 
+    def build_index(self) -> list[TileInfo | None]:
+        """ Returns a list of every tile, indexed by gid. """
+        size = 1
+        for tileset in self.tilesets:
+            size = max(size, tileset.firstgid + tileset.tilecount)
+        tiles: list[TileInfo | None] = [None] * size
+
+        # Tilesets are sorted by descending firstgid, so go backwards so
+        # that later tilesets win, just like in lookup.
+        for tileset in reversed(self.tilesets):
+            for tile_id in range(tileset.tilecount):
+                gid = tileset.get_global_index(tile_id)
+                if gid > 0:
+                    tiles[gid] = TileInfo(tileset, tile_id)
+
+        for tile in tiles:
+            if tile is None:
+                continue
+            alt = tile.properties.alternate
+            if alt is not None:
+                alt_gid = tile.tileset.get_global_index(alt)
+                if alt_gid < len(tiles):
+                    tile.alternate = tiles[alt_gid]
+        return tiles
+
+
+class ViewRegion(typing.NamedTuple):
+    """ An area where the camera should move to a preferred position. """
+    rect: pygame.Rect  # in subpixels
+    preferred_x: int | None
+    preferred_y: int | None
+
 
 class TileMap:
+    # The files this map was loaded from, including tilesets.
+    sources: list[str]
     width: int
     height: int
     tilewidth: int
     tileheight: int
     backgroundcolor: pygame.Color
     tilesets: TileSetList
+    # Every tile in every tileset, indexed by gid.
+    tiles: list[TileInfo | None]
     layers: list[ImageLayer | TileLayer]
     player_layer: int | None
     objects: list[MapObject]
     properties: MapProperties
+    # Pre-rendered chunks, indexed by layer id, then by (chunk row, chunk col).
+    chunks: dict[int, dict[tuple[int, int], TileChunk]]
+    # Tile layers as grids for the renderer, indexed by layer id.
+    atlas: TileAtlas | None
+    atlas_indices: np.ndarray  # indexed by gid, 0 if the tile isn't in the atlas
+    grids: dict[int, TileGridLayer]
+    # The solid tiles in each cell of the layers the player collides with,
+    # given the switches as they were when the cell was last computed.
+    collision: list[list[list[CollisionTile]]] | None
+    collision_layers: list[TileLayer]
+    # For each switch, which cells have tiles that depend on it.
+    switch_cells: dict[str, list[tuple[int, int]]]
+    collision_switches: SwitchState | None
+    collision_switches_on: set[str]
+    collision_version: int
+    # The areas where the camera should move to a preferred position, in the
+    # order they're applied, and a grid to find them by the player's position.
+    view_regions: list[ViewRegion]
+    view_grid: SpatialGrid[ViewRegion] | None
 
     def __init__(self, root: xml.etree.ElementTree.Element, path: str, images: ImageManager):
+        self.sources = [path]
         self.width = int(root.attrib['width'])
         self.height = int(root.attrib['height'])
         self.tilewidth = int(root.attrib['tilewidth'])
@@ -154,6 +364,8 @@ class TileMap:
             firstgid = int(firstgid)
             tileset = load_tileset(tileset_path, firstgid, images)
             self.tilesets.add(tileset)
+            self.sources.append(tileset_path)
+        self.tiles = self.tilesets.build_index()
 
         self.properties = MapProperties(load_properties(root))
         print(f'map properties: {self.properties}')
@@ -175,6 +387,32 @@ class TileMap:
         if len(player_layers) > 0:
             self.player_layer = player_layers[0][0]
 
+        self.chunks = {}
+        self.atlas = None
+        self.grids = {}
+
+        self.collision = None
+        self.collision_layers = [
+            layer for layer in self.layers
+            if isinstance(layer, TileLayer) and (layer.player or self.player_layer is None)]
+        self.switch_cells = {}
+        conditional = [
+            tile.gid for tile in self.tiles
+            if tile is not None and tile.properties.condition is not None]
+        for tile_layer in self.collision_layers:
+            rows, cols = np.nonzero(np.isin(tile_layer.data, conditional))
+            gids = tile_layer.data[rows, cols]
+            for row, col, tile_gid in zip(rows.tolist(), cols.tolist(), gids.tolist()):
+                condition = self.get_tile(tile_gid).properties.condition
+                if condition is None:
+                    continue
+                cells = self.switch_cells.setdefault(
+                    condition_switch(condition), [])
+                cells.append((row, col))
+        self.collision_switches = None
+        self.collision_switches_on = set()
+        self.collision_version = 0
+
         self.objects = []
         for object_group in [node for node in root if node.tag == 'objectgroup']:
             for obj in [obj for obj in object_group if obj.tag == 'object']:
@@ -182,15 +420,53 @@ class TileMap:
         for obj in self.objects:
             print(f'loaded object {obj}')
 
+        self.view_regions = [
+            ViewRegion(obj.scaled_rect(),
+                       obj.properties.preferred_x,
+                       obj.properties.preferred_y)
+            for obj in self.objects
+            if obj.gid is None and (obj.properties.preferred_x is not None or
+                                    obj.properties.preferred_y is not None)]
+        self.view_grid = None
+
+    def load_images(self, images: ImageManager):
+        """ Reloads all of the surfaces for a map that was unpickled. """
+        for tileset in self.tilesets.tilesets:
+            tileset.load_images(images)
+        for layer in self.layers:
+            if isinstance(layer, ImageLayer):
+                layer.load_images(images)
+        self.tiles = self.tilesets.build_index()
+
+    def __getstate__(self):
+        # Anything that refers to surfaces or switches gets rebuilt.
+        state = self.__dict__.copy()
+        state['tiles'] = []
+        state['chunks'] = {}
+        state['atlas'] = None
+        state['grids'] = {}
+        state['collision'] = None
+        state['collision_switches'] = None
+        state['view_grid'] = None
+        return state
+
     @property
     def is_dark(self) -> bool:
         return self.properties.dark
 
-    def is_condition_met(self, tileset: TileSet, tile_id: int, switches: SwitchState):
-        condition = tileset.get_tile_properties(tile_id).condition
-        if condition is None:
-            return True
-        return switches.is_condition_true(condition)
+    def get_tile(self, tile_gid: int) -> TileInfo:
+        if 0 < tile_gid < len(self.tiles):
+            tile = self.tiles[tile_gid]
+            if tile is not None:
+                return tile
+        raise Exception(f"invalid tile_id {tile_gid}")
+
+    def resolve_condition(self, tile: TileInfo, switches: SwitchState) -> TileInfo | None:
+        """ Returns the tile to use given the switches, or None if there isn't one. """
+        condition = tile.properties.condition
+        if condition is None or switches.is_condition_true(condition):
+            return tile
+        return tile.alternate
 
     def draw_background(self,
                         context: RenderContext,
@@ -198,9 +474,19 @@ class TileMap:
                         dest: pygame.Rect,
                         offset: tuple[int, int],
                         switches: SwitchState):
-        batch.draw_rect(dest, self.backgroundcolor)
+        use_grids = self.use_tile_grids(context, batch)
+        if use_grids:
+            context.fill_background(self.backgroundcolor)
+        else:
+            batch.draw_rect(dest, self.backgroundcolor)
         for layer in self.layers:
-            self.draw_layer(context, batch, layer, dest, offset, switches)
+            self.draw_layer(context, batch, layer, dest,
+                            offset, switches, use_grids=use_grids)
+            if (use_grids and not context.grids_interleave() and
+                    self.has_animated_tiles(layer, switches)):
+                # The batch is drawn over every background grid, so the
+                # layers above these animated tiles have to be in it too.
+                use_grids = False
             if isinstance(layer, TileLayer) and layer.player:
                 return
 
@@ -212,12 +498,19 @@ class TileMap:
                         switches: SwitchState):
         if self.player_layer is None:
             return
-        drawing = False
-        for layer in self.layers:
-            if drawing:
-                self.draw_layer(context, batch, layer, dest, offset, switches)
-            if isinstance(layer, TileLayer) and layer.player:
-                drawing = True
+        layers = self.layers[self.player_layer + 1:]
+
+        # The batch is drawn under every foreground grid, so if it isn't drawn
+        # in between them, any layers under animated tiles have to be in it too.
+        batch_layers = 0
+        if self.use_tile_grids(context, batch) and not context.grids_interleave():
+            for i, layer in enumerate(layers):
+                if self.has_animated_tiles(layer, switches):
+                    batch_layers = i + 1
+
+        for i, layer in enumerate(layers):
+            self.draw_layer(context, batch, layer, dest, offset, switches,
+                            foreground=True, use_grids=i >= batch_layers)
 
     def draw_layer(self,
                    context: RenderContext,
@@ -225,7 +518,14 @@ class TileMap:
                    layer: TileLayer | ImageLayer,
                    dest: pygame.Rect,
                    offset: tuple[int, int],
-                   switches: SwitchState):
+                   switches: SwitchState,
+                   foreground: bool = False,
+                   use_grids: bool = True):
+        if use_grids and self.use_tile_grids(context, batch):
+            self.draw_tile_grid(context, batch, layer,
+                                dest, offset, switches, foreground)
+            return
+
         if isinstance(layer, ImageLayer):
             dest = pygame.Rect(
                 offset[0],
@@ -239,81 +539,273 @@ class TileMap:
         offset_y = offset[1]
         tileheight = self.tileheight * SUBPIXELS
         tilewidth = self.tilewidth * SUBPIXELS
-        row_count = math.ceil(dest.height / tileheight) + 1
-        col_count = math.ceil(dest.width / tilewidth) + 1
-
-        start_row = offset_y // -tileheight
+        chunkheight = tileheight * TILE_CHUNK_SIZE
+        chunkwidth = tilewidth * TILE_CHUNK_SIZE
+        chunk_rows = math.ceil(self.height / TILE_CHUNK_SIZE)
+        chunk_cols = math.ceil(self.width / TILE_CHUNK_SIZE)
+        row_count = math.ceil(dest.height / chunkheight) + 1
+        col_count = math.ceil(dest.width / chunkwidth) + 1
+
+        start_row = offset_y // -chunkheight
         end_row = start_row + row_count
         if start_row < 0:
             start_row = 0
-        if end_row > self.height:
-            end_row = self.height
+        if end_row > chunk_rows:
+            end_row = chunk_rows
 
-        start_col = offset_x // -tilewidth
+        start_col = offset_x // -chunkwidth
         end_col = start_col + col_count
         if start_col < 0:
             start_col = 0
-        if end_col > self.width:
-            end_col = self.width
-
-        for row in range(start_row, end_row):
-            for col in range(start_col, end_col):
-                # Compute what to draw where.
-                tile_gid = layer.data[row][col]
-                if tile_gid == 0:
-                    continue
+        if end_col > chunk_cols:
+            end_col = chunk_cols
+
+        s = SUBPIXELS
+        clip = pygame.Rect(dest.x//s, dest.y//s, dest.w//s, dest.h//s)
+        for chunk_row in range(start_row, end_row):
+            for chunk_col in range(start_col, end_col):
+                chunk = self.get_chunk(layer, chunk_row, chunk_col, switches)
+
+                if chunk.surface is not None:
+                    pos_x = chunk_col * chunkwidth + dest.left + offset_x
+                    pos_y = chunk_row * chunkheight + dest.top + offset_y
+                    # Only draw the part that's inside of dest.
+                    area = pygame.Rect(
+                        pos_x // s,
+                        pos_y // s,
+                        chunk.surface.get_width(),
+                        chunk.surface.get_height())
+                    visible = area.clip(clip)
+                    if visible.w > 0 and visible.h > 0:
+                        source = pygame.Rect(
+                            visible.x - area.x,
+                            visible.y - area.y,
+                            visible.w,
+                            visible.h)
+                        destination = pygame.Rect(
+                            visible.x * s,
+                            visible.y * s,
+                            visible.w * s,
+                            visible.h * s)
+                        batch.draw(chunk.surface, destination, source)
+
+                for row, col in chunk.animated:
+                    self.draw_animated_tile(
+                        batch, layer, row, col, dest, offset, switches)
+
+    def use_tile_grids(self, context: RenderContext, batch: SpriteBatch) -> bool:
+        # Grids are drawn underneath everything in the player batch, so they
+        # can't be used for maps drawn on top of other things, like menus.
+        return context.draw_tile_grids and batch is context.player_batch
+
+    def has_animated_tiles(self, layer: TileLayer | ImageLayer, switches: SwitchState) -> bool:
+        """ Whether drawing the layer as a grid also draws tiles into the batch. """
+        if isinstance(layer, ImageLayer):
+            return False
+        return len(self.get_tile_grid(layer, switches).animated) > 0
+
+    def draw_tile_grid(self,
+                       context: RenderContext,
+                       batch: SpriteBatch,
+                       layer: TileLayer | ImageLayer,
+                       dest: pygame.Rect,
+                       offset: tuple[int, int],
+                       switches: SwitchState,
+                       foreground: bool):
+        s = SUBPIXELS
+        if isinstance(layer, ImageLayer):
+            position = (offset[0] // s, offset[1] // s)
+            context.add_tile_grid(layer.get_tile_grid(), position, foreground)
+            return
 
-                tileset, tile_id = self.tilesets.lookup(tile_gid)
+        grid_layer = self.get_tile_grid(layer, switches)
+        position = ((dest.left + offset[0]) // s, (dest.top + offset[1]) // s)
+        context.add_tile_grid(grid_layer.grid, position, foreground)
+        for row, col in grid_layer.animated:
+            self.draw_animated_tile(
+                batch, layer, row, col, dest, offset, switches)
 
-                if not self.is_condition_met(tileset, tile_id, switches):
-                    alt = tileset.get_tile_properties(tile_id).alternate
-                    if alt is None:
-                        continue
-                    tile_id = alt
-
-                source = tileset.get_source_rect(tile_id)
-                pos_x = col * tilewidth + dest.left + offset_x
-                pos_y = row * tileheight + dest.top + offset_y
-
-                # If it's off the top/left side, trim it.
-                if pos_x < dest.left:
-                    extra = (dest.left - pos_x) // SUBPIXELS
-                    source.left += extra
-                    source.width -= extra
-                    pos_x = dest.left
-                if pos_y < dest.top:
-                    extra = (dest.top - pos_y) // SUBPIXELS
-                    source.top += extra
-                    source.height -= extra
-                    pos_y = dest.top
-                if source.width <= 0 or source.height <= 0:
-                    continue
+    def get_atlas(self) -> TileAtlas:
+        """ Returns an atlas of every tile the map's grids can use. """
+        if self.atlas is not None:
+            return self.atlas
 
-                # If it's off the right/bottom side, trim it.
-                pos_right = pos_x + self.tilewidth
-                if pos_right >= dest.right:
-                    source.width = source.width - \
-                        (pos_right - dest.right) // SUBPIXELS
-                if source.width <= 0:
-                    continue
-                pos_bottom = pos_y + self.tileheight
-                if pos_bottom >= dest.bottom:
-                    source.height = source.height - \
-                        (pos_bottom - dest.bottom) // SUBPIXELS
-                if source.height <= 0:
+        gids: set[int] = set()
+        for layer in self.layers:
+            if isinstance(layer, TileLayer):
+                gids.update(np.unique(layer.data).tolist())
+        gids.discard(0)
+
+        tiles: list[TileInfo] = []
+        self.atlas_indices = np.zeros(len(self.tiles), dtype=np.uint32)
+        for tile_gid in sorted(gids):
+            tile = self.get_tile(tile_gid)
+            for t in (tile, tile.alternate):
+                if t is None or t.animation is not None:
                     continue
+                if self.atlas_indices[t.gid] == 0:
+                    tiles.append(t)
+                    self.atlas_indices[t.gid] = len(tiles)
+
+        columns = max(1, math.ceil(math.sqrt(len(tiles))))
+        rows = max(1, math.ceil(len(tiles) / columns))
+        surface = pygame.Surface(
+            (columns * self.tilewidth, rows * self.tileheight), pygame.SRCALPHA)
+        for i, tile in enumerate(tiles):
+            pos = ((i % columns) * self.tilewidth,
+                   (i // columns) * self.tileheight)
+            area = pygame.Rect(
+                tile.source.x,
+                tile.source.y,
+                min(tile.source.w, self.tilewidth),
+                min(tile.source.h, self.tileheight))
+            surface.blit(tile.tileset.surface, pos, area)
+
+        self.atlas = TileAtlas(
+            surface, (self.tilewidth, self.tileheight), columns)
+        return self.atlas
+
+    def get_tile_grid(self, layer: TileLayer, switches: SwitchState) -> TileGridLayer:
+        """ Returns the layer as a grid, updating any cells whose switches changed. """
+        grid_layer = self.grids.get(layer.id)
+        if grid_layer is None:
+            grid_layer = self.build_tile_grid(layer)
+            self.grids[layer.id] = grid_layer
+
+        for condition, cells in grid_layer.conditions.items():
+            value = switches.is_condition_true(condition)
+            if value == cells.value:
+                continue
+            cells.value = value
+            indices = cells.true_indices if value else cells.false_indices
+            grid_layer.grid.set_cells(
+                cells.rows, cells.cols, indices, cells.bounds)
+        return grid_layer
+
+    def build_tile_grid(self, layer: TileLayer) -> TileGridLayer:
+        atlas = self.get_atlas()
+        grid_layer = TileGridLayer(TileGrid(atlas, self.atlas_indices[layer.data]))
+
+        animated: list[int] = []
+        conditional: dict[str, list[int]] = {}
+        for tile_gid in np.unique(layer.data).tolist():
+            if tile_gid == 0:
+                continue
+            tile = self.get_tile(tile_gid)
+            alternate = tile.alternate
+            if (tile.animation is not None or
+                    (alternate is not None and alternate.animation is not None)):
+                animated.append(tile_gid)
+                continue
+            condition = tile.properties.condition
+            if condition is not None:
+                conditional.setdefault(condition, []).append(tile_gid)
+
+        # Animated tiles are left out of the atlas, and drawn separately.
+        rows, cols = np.nonzero(np.isin(layer.data, animated))
+        grid_layer.grid.indices[rows, cols] = 0
+        grid_layer.animated = list(zip(rows.tolist(), cols.tolist()))
+
+        alternates = np.zeros(len(self.tiles), dtype=np.uint32)
+        for tile_gids in conditional.values():
+            for tile_gid in tile_gids:
+                alternate = self.get_tile(tile_gid).alternate
+                if alternate is not None:
+                    alternates[tile_gid] = self.atlas_indices[alternate.gid]
+
+        for condition, tile_gids in conditional.items():
+            rows, cols = np.nonzero(np.isin(layer.data, tile_gids))
+            gids = layer.data[rows, cols]
+            grid_layer.conditions[condition] = GridCondition(
+                rows, cols, self.atlas_indices[gids], alternates[gids])
+        return grid_layer
+
+    def get_chunk(self,
+                  layer: TileLayer,
+                  chunk_row: int,
+                  chunk_col: int,
+                  switches: SwitchState) -> TileChunk:
+        """ Returns the chunk, rendering it if it's missing or out of date. """
+        layer_chunks = self.chunks.setdefault(layer.id, {})
+        chunk = layer_chunks.get((chunk_row, chunk_col))
+        if chunk is None:
+            chunk = TileChunk(chunk_row, chunk_col)
+            self.render_chunk(layer, chunk, switches)
+            layer_chunks[(chunk_row, chunk_col)] = chunk
+        elif len(chunk.conditions) > 0:
+            values = [switches.is_condition_true(condition)
+                      for condition in chunk.conditions]
+            if values != chunk.condition_values:
+                self.render_chunk(layer, chunk, switches)
+        return chunk
+
+    def render_chunk(self, layer: TileLayer, chunk: TileChunk, switches: SwitchState):
+        start_row = chunk.row * TILE_CHUNK_SIZE
+        start_col = chunk.col * TILE_CHUNK_SIZE
+        end_row = min(start_row + TILE_CHUNK_SIZE, self.height)
+        end_col = min(start_col + TILE_CHUNK_SIZE, self.width)
+
+        conditions: set[str] = set()
+        chunk.animated = []
+        surface: pygame.Surface | None = None
+        block = layer.data[start_row:end_row, start_col:end_col]
+        rows, cols = np.nonzero(block)
+        gids = block[rows, cols]
+        for row, col, tile_gid in zip(rows.tolist(), cols.tolist(), gids.tolist()):
+            tile = self.get_tile(tile_gid)
+
+            alternate = tile.alternate
+            if (tile.animation is not None or
+                    (alternate is not None and alternate.animation is not None)):
+                chunk.animated.append((start_row + row, start_col + col))
+                continue
 
-                # Draw the rest of the turtle.
-                destination = pygame.Rect(
-                    pos_x,
-                    pos_y,
-                    tilewidth,
-                    tileheight)
-                if tile_id in tileset.animations:
-                    tileset.animations[tile_id].blit(
-                        batch, destination, reverse=False)
-                else:
-                    batch.draw(tileset.surface, destination, source)
+            condition = tile.properties.condition
+            if condition is not None:
+                conditions.add(condition)
+                if not switches.is_condition_true(condition):
+                    if alternate is None:
+                        continue
+                    tile = alternate
+
+            if surface is None:
+                surface = pygame.Surface(
+                    ((end_col - start_col) * self.tilewidth,
+                     (end_row - start_row) * self.tileheight),
+                    pygame.SRCALPHA)
+            pos = (col * self.tilewidth, row * self.tileheight)
+            surface.blit(tile.tileset.surface, pos, tile.source)
+
+        chunk.surface = surface
+        chunk.conditions = sorted(conditions)
+        chunk.condition_values = [switches.is_condition_true(condition)
+                                  for condition in chunk.conditions]
+
+    def draw_animated_tile(self,
+                           batch: SpriteBatch,
+                           layer: TileLayer,
+                           row: int,
+                           col: int,
+                           dest: pygame.Rect,
+                           offset: tuple[int, int],
+                           switches: SwitchState):
+        tileheight = self.tileheight * SUBPIXELS
+        tilewidth = self.tilewidth * SUBPIXELS
+        pos_x = col * tilewidth + dest.left + offset[0]
+        pos_y = row * tileheight + dest.top + offset[1]
+        destination = pygame.Rect(pos_x, pos_y, tilewidth, tileheight)
+        if not destination.colliderect(dest):
+            return
+
+        tile = self.resolve_condition(
+            self.get_tile(int(layer.data[row, col])), switches)
+        if tile is None:
+            return
+
+        if tile.animation is not None:
+            tile.animation.blit(batch, destination, reverse=False)
+        else:
+            batch.draw(tile.tileset.surface, destination, tile.source)
 
     def get_rect(self, row: int, col: int) -> pygame.Rect:
         return pygame.Rect(
@@ -322,8 +814,7 @@ class TileMap:
             self.tilewidth,
             self.tileheight)
 
-    def is_solid_in_direction(self, tileset: TileSet, tile_id: int, direction: Direction, is_backwards: bool) -> bool:
-        oneway = tileset.get_tile_properties(tile_id).oneway
+    def is_solid_in_direction(self, oneway: str | None, direction: Direction, is_backwards: bool) -> bool:
         if oneway is None:
             return True
         if is_backwards:
@@ -345,32 +836,84 @@ class TileMap:
         tile_gid: int,
         dest: pygame.Rect,
     ):
-        tileset, tile_id = self.tilesets.lookup(tile_gid)
-        src = tileset.get_source_rect(tile_id)
-        batch.draw(tileset.surface, dest, src)
+        tile = self.get_tile(tile_gid)
+        batch.draw(tile.tileset.surface, dest, tile.source)
 
     def get_animation(self, tile_gid: int) -> Animation | None:
-        tileset, tile_id = self.tilesets.lookup(tile_gid)
-        return tileset.animations.get(tile_id)
+        return self.get_tile(tile_gid).animation
 
     def get_tile_properties(self, tile_gid: int) -> TileProperties:
-        tileset, tile_id = self.tilesets.lookup(tile_gid)
-        return tileset.get_tile_properties(tile_id)
+        return self.get_tile(tile_gid).properties
 
     def is_slope(self, tile_gid: int) -> bool:
-        tileset, tile_id = self.tilesets.lookup(tile_gid)
-        return tileset.is_slope(tile_id)
+        return self.get_tile(tile_gid).slope is not None
 
     def get_slope(self, tile_gid: int) -> Slope | None:
-        tileset, tile_id = self.tilesets.lookup(tile_gid)
-        if not tileset.is_slope(tile_id):
-            return None
-        return tileset.get_slope(tile_id)
+        return self.get_tile(tile_gid).slope
 
     def update_animations(self):
         for tileset in self.tilesets.tilesets:
             tileset.update_animations()
 
+    def save_animations(self) -> list[tuple[int, int]]:
+        return [animation.save_state()
+                for tileset in self.tilesets.tilesets
+                for animation in tileset.animations.values()]
+
+    def restore_animations(self, state: list[tuple[int, int]]):
+        animations = [animation
+                      for tileset in self.tilesets.tilesets
+                      for animation in tileset.animations.values()]
+        for animation, animation_state in zip(animations, state):
+            animation.restore_state(animation_state)
+
+    def compute_collision_cell(self, row: int, col: int, switches: SwitchState) -> list[CollisionTile]:
+        tile_rect = self.get_rect(row, col)
+        tile_bounds = pygame.Rect(
+            tile_rect.x * SUBPIXELS,
+            tile_rect.y * SUBPIXELS,
+            tile_rect.w * SUBPIXELS,
+            tile_rect.h * SUBPIXELS)
+        cell: list[CollisionTile] = []
+        for layer in self.collision_layers:
+            tile_gid = int(layer.data[row, col])
+            if tile_gid == 0:
+                continue
+            # Use an alt tile instead of the original if needed.
+            tile = self.resolve_condition(self.get_tile(tile_gid), switches)
+            if tile is None:
+                continue
+            if not tile.properties.solid:
+                continue
+            cell.append(CollisionTile(tile, tile_bounds))
+        return cell
+
+    def update_collision(self, switches: SwitchState):
+        """ Makes sure the collision grid matches the current switches. """
+        if self.collision is not None and self.collision_switches is switches:
+            if self.collision_version == switches.version:
+                return
+            changed = self.collision_switches_on ^ switches.on
+            for switch in changed:
+                for row, col in self.switch_cells.get(switch, []):
+                    self.collision[row][col] = self.compute_collision_cell(
+                        row, col, switches)
+        else:
+            collision: list[list[list[CollisionTile]]] = [
+                [[] for col in range(self.width)]
+                for row in range(self.height)]
+            occupied = np.zeros((self.height, self.width), dtype=bool)
+            for layer in self.collision_layers:
+                occupied |= layer.data != 0
+            rows, cols = np.nonzero(occupied)
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                collision[row][col] = self.compute_collision_cell(
+                    row, col, switches)
+            self.collision = collision
+        self.collision_switches = switches
+        self.collision_switches_on = set(switches.on)
+        self.collision_version = switches.version
+
     class MoveResult:
         # We keep track of two different offsets so that you can be "on" a
         # slope even if there's a higher block next to it. That way, if you're
@@ -437,60 +980,31 @@ class TileMap:
         row2 = player_rect.bottom // (self.tileheight * SUBPIXELS)
         col2 = player_rect.right // (self.tilewidth * SUBPIXELS)
 
+        self.update_collision(switches)
+        collision = self.collision
+        if collision is None:
+            raise Exception('collision grid was not built')
+
         for row in range(row1, row2+1):
             for col in range(col1, col2+1):
-                tile_rect = self.get_rect(row, col)
-                tile_bounds = pygame.Rect(
-                    tile_rect.x * SUBPIXELS,
-                    tile_rect.y * SUBPIXELS,
-                    tile_rect.w * SUBPIXELS,
-                    tile_rect.h * SUBPIXELS)
-                for layer in self.layers:
-                    if not isinstance(layer, TileLayer):
+                for tile in collision[row][col]:
+                    if not self.is_solid_in_direction(tile.oneway, direction, is_backwards):
                         continue
-                    if layer.player or self.player_layer is None:
-                        tile_gid = layer.data[row][col]
-                        if tile_gid == 0:
-                            continue
-
-                        tileset, tile_id = self.tilesets.lookup(tile_gid)
-
-                        if not self.is_condition_met(tileset, tile_id, switches):
-                            alt = tileset.get_tile_properties(
-                                tile_id).alternate
-                            if alt is None:
-                                continue
-                            # Use an alt tile instead of the original.
-                            tile_id = alt
-                            tile_gid = tileset.get_global_index(tile_id)
-                        if not tileset.get_tile_properties(tile_id).solid:
-                            continue
-                        if not self.is_solid_in_direction(tileset, tile_id, direction, is_backwards):
-                            continue
-
-                        props = tileset.get_tile_properties(tile_id)
-                        adjusted_tile_bounds = pygame.Rect(
-                            tile_bounds.x + props.hitbox_left * SUBPIXELS,
-                            tile_bounds.y + props.hitbox_top * SUBPIXELS,
-                            tile_bounds.w +
-                            (props.hitbox_left+props.hitbox_right) * SUBPIXELS,
-                            tile_bounds.h + (props.hitbox_top+props.hitbox_bottom) * SUBPIXELS)
-
-                        soft_offset = try_move_to_bounds(
+
+                    soft_offset = try_move_to_bounds(
+                        player_rect,
+                        tile.bounds,
+                        direction)
+                    hard_offset = soft_offset
+
+                    if tile.slope is not None:
+                        hard_offset = tile.slope.try_move_to_bounds(
                             player_rect,
-                            adjusted_tile_bounds,
+                            tile.bounds,
                             direction)
-                        hard_offset = soft_offset
 
-                        if tileset.is_slope(tile_id):
-                            slope = tileset.get_slope(tile_id)
-                            hard_offset = slope.try_move_to_bounds(
-                                player_rect,
-                                adjusted_tile_bounds,
-                                direction)
-
-                        result.consider_tile(
-                            tile_gid, hard_offset, soft_offset, direction)
+                    result.consider_tile(
+                        tile.gid, hard_offset, soft_offset, direction)
         return result
 
     def get_gravity(self):
@@ -499,31 +1013,40 @@ class TileMap:
         else:
             return self.properties.gravity
 
+    def get_view_grid(self) -> SpatialGrid[ViewRegion]:
+        if self.view_grid is None:
+            self.view_grid = SpatialGrid(SPATIAL_GRID_CELL_SIZE)
+            for region in self.view_regions:
+                self.view_grid.insert(region, region.rect)
+        return self.view_grid
+
     def get_preferred_view(self, player_rect: pygame.Rect) -> tuple[int | None, int | None]:
         preferred_x: int | None = None
         preferred_y: int | None = None
-        for obj in self.objects:
-            if obj.gid is not None:
-                continue
-            rect = obj.rect().copy()
-            rect.x *= SUBPIXELS
-            rect.y *= SUBPIXELS
-            rect.w *= SUBPIXELS
-            rect.h *= SUBPIXELS
-            if not intersect(player_rect, rect):
+        for region in self.get_view_grid().query(player_rect):
+            if not intersect(player_rect, region.rect):
                 continue
-            p_x = obj.properties.preferred_x
-            p_y = obj.properties.preferred_y
-            if p_x is not None:
-                preferred_x = p_x * SUBPIXELS
-            if p_y is not None:
-                preferred_y = p_y * SUBPIXELS
+            if region.preferred_x is not None:
+                preferred_x = region.preferred_x * SUBPIXELS
+            if region.preferred_y is not None:
+                preferred_y = region.preferred_y * SUBPIXELS
         return (preferred_x, preferred_y)
 
 
 def load_map(path: str, images: ImageManager):
+    if USE_LEVEL_CACHE:
+        cached = levelcache.load(path)
+        if isinstance(cached, TileMap):
+            print('loading cached map for ' + path)
+            cached.load_images(images)
+            return cached
+
     print('loading map from ' + path)
     root = xml.etree.ElementTree.parse(path).getroot()
     if not isinstance(root, xml.etree.ElementTree.Element):
         raise Exception('root was not an element')
-    return TileMap(root, path, images)
+    tilemap = TileMap(root, path, images)
+
+    if USE_LEVEL_CACHE:
+        levelcache.save(path, tilemap.sources, tilemap)
+    return tilemap
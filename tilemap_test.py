@@ -0,0 +1,228 @@
+import base64
+import gzip
+import numpy as np
+import pygame
+import unittest
+import xml.etree.ElementTree
+import zlib
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:
+    zstandard = None
+
+from imagemanager import ImageManager
+from constants import RENDER_HEIGHT, RENDER_WIDTH, SUBPIXELS, USE_LEVEL_CACHE
+from render.rendercontext import RenderContext, TileGridDraw
+from switchstate import SwitchState
+import tilemap as tilemap_module
+from tilemap import TileLayer, TileMap, load_layer_data, load_map
+
+SWITCH_MAP = 'assets/levels/EXPRMNTL/SWITCH2.TMX'
+VIEW_MAP = 'assets/levels/MAIN/W1/05.tmx'
+# The player layer has animated tiles, and the layer under it doesn't.
+ANIMATED_MAP = 'assets/levels/EXPRMNTL/UNDRWRLD.TMX'
+
+
+def setUpModule():
+    # Don't write cached maps into the working directory.
+    tilemap_module.USE_LEVEL_CACHE = False
+
+
+def tearDownModule():
+    tilemap_module.USE_LEVEL_CACHE = USE_LEVEL_CACHE
+
+
+def collision_gids(tilemap: TileMap) -> list[list[list[int]]]:
+    if tilemap.collision is None:
+        return []
+    return [[[tile.gid for tile in cell] for cell in row]
+            for row in tilemap.collision]
+
+
+class TestCollisionGrid(unittest.TestCase):
+    def test_switches_update_cells(self):
+        tilemap = load_map(SWITCH_MAP, ImageManager())
+        self.assertTrue(len(tilemap.switch_cells) > 0)
+
+        switches = SwitchState()
+        tilemap.update_collision(switches)
+        before = collision_gids(tilemap)
+
+        for switch in tilemap.switch_cells.keys():
+            switches.toggle(switch)
+        tilemap.update_collision(switches)
+        after = collision_gids(tilemap)
+        self.assertNotEqual(before, after)
+
+        # Updating in place should match building from scratch.
+        fresh = load_map(SWITCH_MAP, ImageManager())
+        fresh.update_collision(switches)
+        self.assertEqual(collision_gids(fresh), after)
+
+    def test_unchanged_switches_keep_cells(self):
+        tilemap = load_map(SWITCH_MAP, ImageManager())
+        switches = SwitchState()
+        tilemap.update_collision(switches)
+        collision = tilemap.collision
+
+        switches.turn_off('red')
+        self.assertEqual(0, switches.version)
+        tilemap.update_collision(switches)
+        self.assertIs(collision, tilemap.collision)
+
+
+class TestTileGrid(unittest.TestCase):
+    def grids(self, tilemap: TileMap, switches: SwitchState) -> list[np.ndarray]:
+        return [tilemap.get_tile_grid(layer, switches).grid.indices.copy()
+                for layer in tilemap.layers if isinstance(layer, TileLayer)]
+
+    def test_switches_update_cells(self):
+        tilemap = load_map(SWITCH_MAP, ImageManager())
+        switches = SwitchState()
+        before = self.grids(tilemap, switches)
+        for grid_layer in tilemap.grids.values():
+            grid_layer.grid.dirty = None
+
+        for switch in tilemap.switch_cells.keys():
+            switches.toggle(switch)
+        after = self.grids(tilemap, switches)
+        self.assertTrue(any((b != a).any() for b, a in zip(before, after)))
+        self.assertTrue(any(grid_layer.grid.dirty is not None
+                            for grid_layer in tilemap.grids.values()))
+
+        # Updating in place should match building from scratch.
+        fresh = load_map(SWITCH_MAP, ImageManager())
+        for expected, actual in zip(self.grids(fresh, switches), after):
+            self.assertEqual(expected.tolist(), actual.tolist())
+
+    def test_draws_keep_their_indices(self):
+        tilemap = load_map(SWITCH_MAP, ImageManager())
+        switches = SwitchState()
+        layers = [layer for layer in tilemap.layers if isinstance(layer, TileLayer)]
+        draws = [TileGridDraw(tilemap.get_tile_grid(layer, switches).grid, (0, 0))
+                 for layer in layers]
+        before = [draw.indices.copy() for draw in draws]
+
+        for switch in tilemap.switch_cells.keys():
+            switches.toggle(switch)
+        after = self.grids(tilemap, switches)
+        self.assertTrue(any((b != a).any() for b, a in zip(before, after)))
+        for draw, expected in zip(draws, before):
+            self.assertEqual(expected.tolist(), draw.indices.tolist())
+
+        # The next draw should take the changes.
+        draws = [TileGridDraw(tilemap.get_tile_grid(layer, switches).grid, (0, 0))
+                 for layer in layers]
+        self.assertTrue(any(draw.dirty is not None for draw in draws))
+        self.assertTrue(all(draw.grid.dirty is None for draw in draws))
+
+    def animated_below(self) -> TileMap:
+        """ Returns a map with animated tiles in the layer under the player layer. """
+        tilemap = load_map(ANIMATED_MAP, ImageManager())
+        below, player = tilemap.layers[0], tilemap.layers[1]
+        assert isinstance(below, TileLayer) and isinstance(player, TileLayer)
+        below.data = player.data.copy()
+        return tilemap
+
+    def draw_background(self, tilemap: TileMap, context: RenderContext):
+        context.draw_tile_grids = True
+        tilemap.draw_background(context, context.player_batch,
+                                context.logical_area, (0, 0), SwitchState())
+
+    def test_grids_go_over_animated_tiles_below_them(self):
+        tilemap = self.animated_below()
+        context = RenderContext((RENDER_WIDTH, RENDER_HEIGHT), True)
+        self.draw_background(tilemap, context)
+        self.assertEqual(2, len(context.background_grids))
+        first, second = context.background_grids
+        self.assertEqual(0, first.vertices_before)
+        self.assertTrue(second.vertices_before > 0)
+
+    def test_layers_over_animated_tiles_skip_grids_without_interleaving(self):
+        tilemap = self.animated_below()
+        context = RenderContext((RENDER_WIDTH, RENDER_HEIGHT))
+        self.draw_background(tilemap, context)
+        # The player layer is drawn into the batch, over the animated tiles.
+        self.assertEqual(1, len(context.background_grids))
+
+    def test_indices_are_in_atlas(self):
+        tilemap = load_map(SWITCH_MAP, ImageManager())
+        atlas = tilemap.get_atlas()
+        count = (atlas.surface.get_width() // atlas.tile_size[0]) * \
+            (atlas.surface.get_height() // atlas.tile_size[1])
+        for indices in self.grids(tilemap, SwitchState()):
+            self.assertTrue(indices.max() <= count)
+
+
+class TestPreferredView(unittest.TestCase):
+    def test_matches_every_object(self):
+        tilemap = load_map(VIEW_MAP, ImageManager())
+        self.assertTrue(len(tilemap.view_regions) > 0)
+        found = 0
+        step = 16 * SUBPIXELS
+        for y in range(0, tilemap.height * tilemap.tileheight * SUBPIXELS, step):
+            for x in range(0, tilemap.width * tilemap.tilewidth * SUBPIXELS, step):
+                player_rect = pygame.Rect(x, y, 8 * SUBPIXELS, 16 * SUBPIXELS)
+                expected: list[int | None] = [None, None]
+                for obj in tilemap.objects:
+                    if obj.gid is not None:
+                        continue
+                    if not player_rect.colliderect(obj.scaled_rect().inflate(2, 2)):
+                        continue
+                    if obj.properties.preferred_x is not None:
+                        expected[0] = obj.properties.preferred_x * SUBPIXELS
+                    if obj.properties.preferred_y is not None:
+                        expected[1] = obj.properties.preferred_y * SUBPIXELS
+                if expected != [None, None]:
+                    found += 1
+                self.assertEqual(tuple(expected),
+                                 tilemap.get_preferred_view(player_rect))
+        self.assertTrue(found > 0)
+
+
+def data_node(text: str, encoding: str, compression: str | None = None):
+    node = xml.etree.ElementTree.Element('data', {'encoding': encoding})
+    if compression is not None:
+        node.attrib['compression'] = compression
+    node.text = text
+    return node
+
+
+class TestLayerData(unittest.TestCase):
+    gids = [0, 1, 2, 3000000000, 45, 0]
+
+    def encode(self, compress=lambda raw: raw) -> str:
+        raw = np.array(self.gids, dtype='<u4').tobytes()
+        return base64.b64encode(compress(raw)).decode('ascii')
+
+    def test_csv(self):
+        node = data_node('\n0,1,2,\n3000000000,45,0\n', 'csv')
+        self.assertEqual(self.gids, load_layer_data(node).tolist())
+
+    def test_base64(self):
+        node = data_node(self.encode(), 'base64')
+        self.assertEqual(self.gids, load_layer_data(node).tolist())
+
+    def test_base64_zlib(self):
+        node = data_node(self.encode(zlib.compress), 'base64', 'zlib')
+        self.assertEqual(self.gids, load_layer_data(node).tolist())
+
+    def test_base64_gzip(self):
+        node = data_node(self.encode(gzip.compress), 'base64', 'gzip')
+        self.assertEqual(self.gids, load_layer_data(node).tolist())
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_base64_zstd(self):
+        compressor = zstandard.ZstdCompressor()
+        node = data_node(self.encode(compressor.compress), 'base64', 'zstd')
+        self.assertEqual(self.gids, load_layer_data(node).tolist())
+
+    def test_bad_csv(self):
+        node = data_node('0,1,x,3', 'csv')
+        with self.assertRaises(ValueError):
+            load_layer_data(node)
+
+
+if __name__ == '__main__':
+    unittest.main()
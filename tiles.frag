@@ -0,0 +1,42 @@
+#version 120
+
+// The grid's position in the scene, in pixels.
+uniform vec2 iPosition;
+
+// The grid and atlas sizes. Tiles are the same size in both.
+uniform vec2 iGridSize;
+uniform vec2 iTileSize;
+uniform vec2 iAtlasSize;
+uniform float iAtlasColumns;
+
+// Textures
+uniform sampler2D iIndexTexture;
+uniform sampler2D iAtlasTexture;
+
+// Each index is a little endian int stored in the bytes of a texel.
+float read_index(vec2 cell) {
+    vec4 texel = texture2D(iIndexTexture, (cell + 0.5) / iGridSize);
+    vec3 bytes = floor(texel.rgb * 255.0 + 0.5);
+    return bytes.r + bytes.g * 256.0 + bytes.b * 65536.0;
+}
+
+void main() {
+    // The scene is stored top row first, just like the other textures, so
+    // the first row of the framebuffer is the top of the screen.
+    vec2 pixel = gl_FragCoord.xy - iPosition;
+    vec2 cell = floor(pixel / iTileSize);
+    if (cell.x < 0.0 || cell.y < 0.0 || cell.x >= iGridSize.x || cell.y >= iGridSize.y) {
+        discard;
+    }
+
+    float index = read_index(cell);
+    if (index < 0.5) {
+        discard;
+    }
+    index -= 1.0;
+
+    float row = floor((index + 0.5) / iAtlasColumns);
+    float col = index - row * iAtlasColumns;
+    vec2 source = vec2(col, row) * iTileSize + (pixel - cell * iTileSize);
+    gl_FragColor = texture2D(iAtlasTexture, source / iAtlasSize);
+}
@@ -27,6 +27,7 @@ class ImageLoader(typing.Protocol):
 
 
 class TileSet:
+    path: str
     name: str
     firstgid: int
     tilewidth: int
@@ -42,6 +43,7 @@ class TileSet:
     tile_properties: dict[int, TileProperties]
 
     def __init__(self, root: xml.etree.ElementTree.Element, path: str, firstgid: int, images: ImageLoader):
+        self.path = path
         self.name = root.attrib['name']
         self.firstgid = firstgid
         self.tilewidth = int(root.attrib['tilewidth'])
@@ -51,13 +53,8 @@ class TileSet:
         self.image = [TileSetImage(node)
                       for node in root if node.tag == 'image'][0]
 
-        img_path = os.path.join(os.path.dirname(path), self.image.source)
-        print('loading tileset texture from ' + img_path)
-        self.surface = images.load_image(img_path)
-
         self.properties = TileSetProperties(load_properties(root))
 
-        self.animations = {}
         self.slopes = {}
         self.default_tile_properties = TileProperties({})
         self.tile_properties = {}
@@ -67,18 +64,35 @@ class TileSet:
                 load_properties(tile))
             if self.tile_properties[tile_id].slope:
                 self.slopes[tile_id] = Slope(self.tile_properties[tile_id])
-            animation_path = self.tile_properties[tile_id].animation
+
+        self.load_images(images)
+
+        print(f'tileset properties: {self.properties}')
+        print(f'tile properties: {self.tile_properties}')
+
+    def load_images(self, images: ImageLoader):
+        img_path = os.path.join(os.path.dirname(self.path), self.image.source)
+        print('loading tileset texture from ' + img_path)
+        self.surface = images.load_image(img_path)
+
+        self.animations = {}
+        for tile_id, tile_properties in self.tile_properties.items():
+            animation_path = tile_properties.animation
             if animation_path is not None:
                 animation_path = os.path.join(
-                    os.path.dirname(path), animation_path)
+                    os.path.dirname(self.path), animation_path)
                 print(
                     f'loading animation for tile {tile_id} from {animation_path}')
                 surface = images.load_image(animation_path)
                 animation = Animation(surface, 8, 8)
                 self.animations[tile_id] = animation
 
-        print(f'tileset properties: {self.properties}')
-        print(f'tile properties: {self.tile_properties}')
+    def __getstate__(self):
+        # Surfaces can't be pickled, so they have to be reloaded with load_images.
+        state = self.__dict__.copy()
+        del state['surface']
+        del state['animations']
+        return state
 
     def get_local_index(self, tile_gid: int) -> int | None:
         if tile_gid < self.firstgid:
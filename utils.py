@@ -3,6 +3,8 @@ from enum import Enum
 
 import pygame
 
+from constants import MAX_INTERPOLATION_DISTANCE
+
 
 class Direction(Enum):
     UP = 1
@@ -132,6 +134,14 @@ def intersect(rect1: pygame.Rect, rect2: pygame.Rect) -> bool:
     return True
 
 
+def interpolate(previous: int, current: int, amount: float) -> int:
+    """ Returns the position amount of the way from previous to current. """
+    if abs(current - previous) > MAX_INTERPOLATION_DISTANCE:
+        # It teleported, so don't draw it in between.
+        return current
+    return previous + round((current - previous) * amount)
+
+
 def inside(rect: pygame.Rect, point: tuple[int, int]) -> bool:
     if point[0] < rect.left or point[0] > rect.right:
         return False
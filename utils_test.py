@@ -2,7 +2,8 @@
 import pygame
 import unittest
 
-from utils import cmp_in_direction, try_move_to_bounds, try_move_to_slope_bounds, Direction
+from constants import MAX_INTERPOLATION_DISTANCE
+from utils import cmp_in_direction, interpolate, try_move_to_bounds, try_move_to_slope_bounds, Direction
 
 
 def Bounds(x: int, y: int, w: int, h: int):
@@ -81,5 +82,18 @@ class TestIntersect(unittest.TestCase):
         self.assertEqual(-120, result)
 
 
+class TestInterpolate(unittest.TestCase):
+
+    def test_in_between(self):
+        self.assertEqual(100, interpolate(100, 200, 0.0))
+        self.assertEqual(150, interpolate(100, 200, 0.5))
+        self.assertEqual(200, interpolate(100, 200, 1.0))
+        self.assertEqual(175, interpolate(200, 100, 0.25))
+
+    def test_teleport(self):
+        far = MAX_INTERPOLATION_DISTANCE + 1
+        self.assertEqual(far, interpolate(0, far, 0.5))
+
+
 if __name__ == '__main__':
     unittest.main()
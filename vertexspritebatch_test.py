@@ -0,0 +1,76 @@
+import pygame
+import unittest
+
+from constants import SUBPIXELS
+from render.vertexspritebatch import VertexSpriteBatch, VERTEX_SIZE
+
+
+def rect(x: int, y: int, w: int, h: int) -> pygame.Rect:
+    s = SUBPIXELS
+    return pygame.Rect(x * s, y * s, w * s, h * s)
+
+
+class TestVertexSpriteBatch(unittest.TestCase):
+    def test_runs_share_textures(self):
+        batch = VertexSpriteBatch((320, 180))
+        atlas = pygame.Surface((64, 32), pygame.SRCALPHA)
+        first = atlas.subsurface(pygame.Rect(0, 0, 32, 32))
+        second = atlas.subsurface(pygame.Rect(32, 0, 32, 32))
+        other = pygame.Surface((8, 8), pygame.SRCALPHA)
+
+        batch.draw(first, rect(0, 0, 32, 32))
+        batch.draw(second, rect(40, 0, 32, 32))
+        batch.draw(other, rect(80, 0, 8, 8))
+        batch.draw(first, rect(90, 0, 32, 32))
+
+        self.assertEqual([atlas, other, atlas],
+                         [run.texture for run in batch.runs])
+        self.assertEqual([12, 6, 6], [run.count for run in batch.runs])
+        self.assertEqual(24, batch.vertex_count)
+
+    def test_subsurface_coordinates(self):
+        batch = VertexSpriteBatch((320, 180))
+        atlas = pygame.Surface((64, 32), pygame.SRCALPHA)
+        image = atlas.subsurface(pygame.Rect(32, 0, 32, 32))
+        batch.draw(image, rect(10, 20, 0, 0), pygame.Rect(8, 16, 8, 8))
+
+        first = batch.vertices[:VERTEX_SIZE]
+        self.assertEqual([10, 20, 40 / 64, 16 / 32], list(first[:4]))
+        third = batch.vertices[2*VERTEX_SIZE:3*VERTEX_SIZE]
+        self.assertEqual([18, 28, 48 / 64, 24 / 32], list(third[:4]))
+
+    def test_reverse_flips_coordinates(self):
+        batch = VertexSpriteBatch((320, 180))
+        atlas = pygame.Surface((64, 32), pygame.SRCALPHA)
+        image = atlas.subsurface(pygame.Rect(32, 0, 32, 32))
+        batch.draw(image, rect(10, 20, 0, 0), pygame.Rect(8, 16, 8, 8), True)
+
+        # The reversed sprite is drawn from the same texture.
+        self.assertEqual([atlas], [run.texture for run in batch.runs])
+        first = batch.vertices[:VERTEX_SIZE]
+        self.assertEqual([10, 20, 48 / 64, 16 / 32], list(first[:4]))
+        third = batch.vertices[2*VERTEX_SIZE:3*VERTEX_SIZE]
+        self.assertEqual([18, 28, 40 / 64, 24 / 32], list(third[:4]))
+
+    def test_offscreen_is_skipped(self):
+        batch = VertexSpriteBatch((320, 180))
+        surface = pygame.Surface((8, 8), pygame.SRCALPHA)
+        batch.draw(surface, rect(-8, 0, 8, 8))
+        batch.draw(surface, rect(320, 0, 8, 8))
+        batch.draw_rect(rect(0, -8, 8, 8), 'red')
+        self.assertEqual(0, batch.vertex_count)
+        self.assertEqual([], batch.runs)
+
+    def test_clear(self):
+        batch = VertexSpriteBatch((320, 180))
+        batch.draw_rect(rect(0, -4, 8, 8), 'red')
+        self.assertEqual([None], [run.texture for run in batch.runs])
+        # The part above the top of the screen is cut off.
+        self.assertEqual([0, 0], list(batch.vertices[:2]))
+        batch.clear()
+        self.assertEqual(0, batch.vertex_count)
+        self.assertEqual([], batch.runs)
+
+
+if __name__ == '__main__':
+    unittest.main()